@@ -0,0 +1,76 @@
+# Benchmark of the AIDA64 decode / parse / index layer, runs on any OS.
+#
+#   python benchmarks/bench_aida64.py [fixture]
+#
+# fixture: raw bytes dumped from the "AIDA64_SensorValues" shared memory block.
+# Without a fixture a synthetic block with a typical number of sensors is used.
+import os
+import sys
+import json
+import time
+import xml.etree.ElementTree as xml_tree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensors.aida64 import Aida64, decode
+
+# Getter calls per tick in sensors_windows before the cached reader
+GETTERS_PER_TICK = 15
+
+def synthetic_fixture():
+    items = [("sys", "SCPUUTI", "CPU Utilization", "12"), ("sys", "SMEMUTI", "Memory Utilization", "41"),
+             ("sys", "SUSEDMEM", "Used Memory", "6543"), ("sys", "SFREEMEM", "Free Memory", "9876"),
+             ("sys", "SUSEDVMEM", "Used Virtual Memory", "8765"), ("sys", "SFREEVMEM", "Free Virtual Memory", "12345"),
+             ("temp", "TCPUPKG", "CPU Package", "54"), ("temp", "TGPU1DIO", "GPU1 Diode", "48"),
+             ("sys", "SGPU1UTI", "GPU1 Utilization", "7")]
+    for i in range(40):
+        items.append(("temp", "TCC-1-%d" % i, "CPU Core #%d" % i, "50"))
+        items.append(("volt", "VCC-1-%d" % i, "CPU Core #%d VID" % i, "1.120"))
+    for drive in "CDEF":
+        items.append(("sys", "SUSEDSPC%s" % drive, "%s: Used Space" % drive, "120000"))
+        items.append(("sys", "SFREESPC%s" % drive, "%s: Free Space" % drive, "80000"))
+    return "".join("<%s><id>%s</id><label>%s</label><value>%s</value></%s>" % (t, i, l, v, t)
+                   for t, i, l, v in items).encode()
+
+def legacy_get_data(raw):
+    # Previous sensors_windows._get_data(): DOM parse into nested dicts
+    data = {}
+    data_tree = xml_tree.fromstring(f"<root>{decode(raw)}</root>")
+    for item in data_tree:
+        if item.tag not in data: data[item.tag] = {}
+        data[item.tag][item.find("label").text] = {
+            "id": item.find("id").text,
+            "value": item.find("value").text
+        }
+    return data
+
+def measure(fn, ticks):
+    start = time.perf_counter()
+    for _ in range(ticks): fn()
+    return (time.perf_counter() - start) / ticks
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            raw = f.read().rstrip(b"\x00")
+    else:
+        raw = synthetic_fixture()
+    ticks = 200
+
+    def legacy_tick():
+        for _ in range(GETTERS_PER_TICK): legacy_get_data(raw)
+
+    reader = Aida64(lambda: raw)
+    def cached_tick():
+        reader.invalidate()
+        for _ in range(GETTERS_PER_TICK): reader.value("sys", "CPU Utilization")
+
+    print(json.dumps({
+        "benchmark": "aida64",
+        "bytes": len(raw),
+        "labels": len(reader.snapshot()[0]),
+        "legacy_tick_s": measure(legacy_tick, ticks),
+        "cached_tick_s": measure(cached_tick, ticks),
+    }))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Per-tick cost of the collection and send path, what one tick of the send loop costs.
+#
+#   python benchmarks/bench_collect.py [ticks] [real,fake]
+#
+# For each backend (the real one of this OS, and benchmarks/fake_backend.py whose values are
+# deterministic), measures wall time, CPU time and tracemalloc allocations of:
+# - each payload group reader on its own (collector.GROUPS),
+# - collect: scheduler.Scheduler.collect with every group due, i.e. the parallel reads, the
+#   thread handoffs and the budget waits,
+# - push_json / push_binary / push_delta: udp_client.Engine.push of that payload to one local
+#   simulator.DockSimulator, as a JSON dock, a binary dock and a binary dock in delta mode
+#   (encoding, Seq / Target suffix, send),
+# - tick: udp_client.Engine.tick, the collection in the executor then the push, one
+#   iteration of the send loop.
+# The acks are handled between two calls, outside the measurement.
+# alloc_peak_bytes is the highest peak of a single call, alloc_retained_bytes what each call
+# leaves allocated on average (a leak shows as a steady positive value).
+import os
+import sys
+import json
+import time
+import asyncio
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import wire
+import delta
+import stats
+import collector
+import scheduler
+import udp_client
+import fake_backend
+from simulator import DockSimulator
+
+async def measure(fn, ticks, settle):
+    # fn may be a coroutine function, settle() runs between two calls
+    async def call():
+        result = fn()
+        if asyncio.iscoroutine(result): await result
+
+    await call() # warm up, and lets the backend resolve its sources
+    await settle()
+    wall = 0.0
+    cpu = 0.0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        await call()
+        wall += time.perf_counter() - start
+        cpu += time.process_time() - start_cpu
+        await settle()
+    result = {"wall_per_call_s": wall / ticks, "cpu_per_call_s": cpu / ticks}
+
+    # Separate pass, tracemalloc slows every allocation down
+    calls = min(ticks, 200)
+    tracemalloc.start()
+    peak = 0
+    start, _ = tracemalloc.get_traced_memory()
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await call()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        await settle()
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["alloc_peak_bytes"] = peak
+    result["alloc_retained_bytes"] = (end - start) / calls
+    return result
+
+async def run(ticks, groups):
+    loop = asyncio.get_running_loop()
+    transport, dock = await loop.create_datagram_endpoint(lambda: DockSimulator(binary=True, delta=True, keep=0),
+                                                          local_addr=("127.0.0.1", 0))
+    address = transport.get_extra_info("sockname")
+    # Every group due at every call
+    schedule = scheduler.Scheduler({name: 1e-6 for name, _ in groups}, groups=groups)
+
+    engines = {
+        "json": udp_client.Engine(schedule.collect, [address], log=lambda line: None, binary=False),
+        "binary": udp_client.Engine(schedule.collect, [address], log=lambda line: None),
+        "delta": udp_client.Engine(schedule.collect, [address], log=lambda line: None,
+                                   delta=delta.KeyframeDelta())
+    }
+    for engine in engines.values():
+        await engine.open()
+        engine.report_interval = float("inf")
+    engines["binary"].targets[0].wire = wire.VERSION
+    engines["delta"].targets[0].wire = wire.VERSION
+    engines["delta"].targets[0].delta = True
+
+    async def settle():
+        # Until every packet in flight is acked
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline and any(target.pending for engine in engines.values()
+                                                  for target in engine.targets):
+            await asyncio.sleep(0.0005)
+
+    async def nothing(): pass
+
+    results = {name: await measure(read, ticks, nothing) for name, read in groups}
+    results["collect"] = await measure(schedule.collect, ticks, nothing)
+    device_info = schedule.collect()
+    for name, engine in engines.items():
+        results["push_" + name] = await measure(lambda: engine.push(device_info), ticks, settle)
+    results["tick"] = await measure(engines["json"].tick, ticks, settle)
+    results["json_bytes"] = len(engines["json"].encode(device_info)) + 1
+    results["binary_bytes"] = len(wire.schema_for(device_info).encode(device_info)) + 4 + wire.TRAILER.size
+    results["acked"] = sum(target.acked for engine in engines.values() for target in engine.targets)
+    results["lost"] = sum(target.timeouts for engine in engines.values() for target in engine.targets)
+
+    for engine in engines.values(): engine.close()
+    schedule.close()
+    transport.close()
+    return results, device_info
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    backends = sys.argv[2].split(",") if len(sys.argv) > 2 else ["real", "fake"]
+    result = {"benchmark": "collect", "ticks": ticks, "python": sys.version.split()[0]}
+    # The real backend first: installing the fake one replaces it for the rest of the run
+    if "real" in backends:
+        results, _ = asyncio.run(run(ticks, collector.GROUPS))
+        result["real"] = dict(results, backend=stats.sensors.__name__)
+    if "fake" in backends:
+        fake_backend.install(stats)
+        groups = [(name, fake_backend.host_ip if name == "IP" else read) for name, read in collector.GROUPS]
+        results, device_info = asyncio.run(run(ticks, groups))
+        result["fake"] = dict(results, payload=device_info)
+    print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Per-tick cost of sending one collection pass to 1..100 docks.
+#
+#   python benchmarks/bench_fanout.py [ticks]
+#
+# Each dock is a local simulator.DockSimulator without impairments. The payload is a fixed,
+# representative device_info (common.PAYLOAD) so the numbers only depend on the send path.
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import udp_client
+from common import PAYLOAD
+from simulator import DockSimulator
+
+async def run(count, ticks):
+    loop = asyncio.get_running_loop()
+    docks = [await loop.create_datagram_endpoint(DockSimulator, local_addr=("127.0.0.1", 0)) for _ in range(count)]
+    targets = [("127.0.0.1", transport.get_extra_info("sockname")[1]) for transport, _ in docks]
+
+    collections = 0
+    def collect():
+        nonlocal collections
+        collections += 1
+        return dict(PAYLOAD)
+
+    engine = udp_client.Engine(collect, targets, log=lambda line: None)
+    await engine.open()
+    wall = 0.0
+    cpu = 0.0
+    for tick in range(1, ticks + 1):
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        await engine.tick()
+        wall += time.perf_counter() - start
+        cpu += time.process_time() - start_cpu
+        # Let the stand-ins ack this tick before the next one, outside the measurement
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline and sum(target.acked for target in engine.targets) < count * tick:
+            await asyncio.sleep(0.001)
+    engine.close()
+    for transport, _ in docks: transport.close()
+
+    return {
+        "targets": count,
+        # Collection, serialisation and fan-out of one tick
+        "wall_per_tick_s": wall / ticks,
+        "cpu_per_tick_s": cpu / ticks,
+        "collections_per_tick": collections / ticks,
+        "received": sum(dock.packets for _, dock in docks),
+        "acked": sum(target.acked for target in engine.targets),
+        "sent": sum(target.sent for target in engine.targets)
+    }
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    results = [asyncio.run(run(count, ticks)) for count in (1, 10, 50, 100)]
+    print(json.dumps({"benchmark": "fanout", "ticks": ticks, "results": results}))
+
+if __name__ == '__main__':
+    main()
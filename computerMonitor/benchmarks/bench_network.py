@@ -0,0 +1,81 @@
+# Send path and ack handling under simulated network conditions, no dock needed.
+#
+#   python benchmarks/bench_network.py [ticks]
+#
+# One engine pushes common.PAYLOAD every 20 ms to a simulator.DockSimulator per scenario,
+# with binary wire and keyframe + delta negotiation on. Slow acks arrive after the
+# engine's ack timeout, so they count as lost then late. Seeded: runs are repeatable.
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import delta
+import udp_client
+from common import PAYLOAD
+from simulator import DockSimulator
+
+TICK = 0.02
+ACK_TIMEOUT = 0.5
+
+# name: DockSimulator arguments, seconds and probabilities
+SCENARIOS = {
+    "lan": {},
+    "wifi": {"latency": 0.005, "jitter": 0.004, "loss": 0.01, "reorder": 0.02},
+    "congested": {"latency": 0.05, "jitter": 0.04, "loss": 0.05, "duplicate": 0.02, "reorder": 0.1, "slow": 0.02},
+    "worst": {"latency": 0.2, "jitter": 0.15, "loss": 0.2, "duplicate": 0.1, "reorder": 0.2, "slow": 0.1},
+}
+
+async def run(name, impairments, ticks):
+    loop = asyncio.get_running_loop()
+    transport, dock = await loop.create_datagram_endpoint(
+        lambda: DockSimulator(slow_delay=ACK_TIMEOUT * 3, binary=True, delta=True, **impairments),
+        local_addr=("127.0.0.1", 0))
+
+    engine = udp_client.Engine(lambda: dict(PAYLOAD), [("127.0.0.1", transport.get_extra_info("sockname")[1])],
+                               interval=TICK, log=lambda line: None, delta=delta.KeyframeDelta())
+    engine.ack_timeout = ACK_TIMEOUT
+    await engine.open()
+    start = time.perf_counter()
+    deadline = loop.time()
+    for _ in range(ticks):
+        await engine.tick()
+        deadline += TICK
+        await asyncio.sleep(max(0, deadline - loop.time()))
+    elapsed = time.perf_counter() - start
+    # Every packet acked or expired, and slow acks back
+    await asyncio.sleep(ACK_TIMEOUT * 3 + 0.1)
+    engine.close()
+    transport.close()
+
+    target = engine.targets[0]
+    return {
+        "scenario": name,
+        "sent": target.sent,
+        "acked": target.acked,
+        "errors": target.errors,
+        "lost": target.timeouts,
+        "late": target.late,
+        "rtt_p50_ms": target.rtt.percentile(50),
+        "rtt_p95_ms": target.rtt.percentile(95),
+        "binary": target.wire is not None,
+        "delta": target.delta,
+        "dock_packets": dock.packets,
+        "dock_payloads": dock.payloads,
+        "dock_packets_per_s": dock.packets / elapsed,
+        "dock_dropped": dock.dropped,
+        "dock_duplicated": dock.duplicated,
+        "dock_reordered": dock.reordered,
+        "dock_slow": dock.slowed
+    }
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    results = [asyncio.run(run(name, impairments, ticks)) for name, impairments in SCENARIOS.items()]
+    print(json.dumps({"benchmark": "network", "ticks": ticks, "tick_s": TICK, "ack_timeout_s": ACK_TIMEOUT,
+                      "results": results}))
+
+if __name__ == '__main__':
+    main()
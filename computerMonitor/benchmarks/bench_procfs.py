@@ -0,0 +1,48 @@
+# Per-tick cost of the Linux /proc fast path against the psutil path.
+#
+#   python benchmarks/bench_procfs.py [ticks]
+#
+# One tick reads what the payload needs: per-CPU times, memory / swap and NIC counters.
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import psutil
+from sensors.procfs import open_procfs
+
+def psutil_tick():
+    psutil.cpu_times(percpu=True)
+    psutil.virtual_memory()
+    psutil.swap_memory()
+    psutil.net_io_counters(pernic=True)
+
+def measure(fn, ticks):
+    fn() # warm up
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(ticks): fn()
+    return {
+        "wall_per_tick_s": (time.perf_counter() - wall) / ticks,
+        "cpu_per_tick_s": (time.process_time() - cpu) / ticks
+    }
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    result = {"benchmark": "procfs", "ticks": ticks, "psutil": measure(psutil_tick, ticks)}
+
+    procfs = open_procfs()
+    if procfs is None:
+        result["procfs"] = None
+    else:
+        def procfs_tick():
+            procfs.cpu_times()
+            procfs.memory()
+            procfs.net_counters()
+        result["procfs"] = measure(procfs_tick, ticks)
+        result["speedup"] = result["psutil"]["wall_per_tick_s"] / result["procfs"]["wall_per_tick_s"]
+    print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
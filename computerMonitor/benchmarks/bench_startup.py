@@ -0,0 +1,92 @@
+# Cold start: time to the first payload sent, and import time per module, each measured in
+# a fresh interpreter.
+#
+#   python benchmarks/bench_startup.py [runs]
+#
+# The first payload is the first datagram a local UDP stand-in receives from headless.py,
+# counted from the start of the subprocess. Import times come from `python -X importtime`
+# on the modules the headless entry point loads (cumulative microseconds, median of runs).
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Project modules, and the third party ones worth watching
+MODULES = ("service", "udp_client", "stats", "collector", "scheduler", "wire", "delta", "cadence",
+           "sensors.sensors_python", "sensors.sensors_windows", "psutil", "GPUtil", "asyncio")
+
+def interpreter_start():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - start
+
+def import_times(module):
+    # {module: cumulative µs} for one cold import of `module`
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit(): times[name.strip()] = int(cumulative)
+    return times
+
+def first_payload(config_path, dock, timeout=30):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "headless.py", "--config", config_path], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        dock.settimeout(timeout)
+        dock.recvfrom(65536)
+        return time.perf_counter() - start
+    finally:
+        process.send_signal(signal.SIGTERM if hasattr(signal, "SIGTERM") else signal.SIGINT)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    dock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dock.bind(("127.0.0.1", 0))
+    with tempfile.NamedTemporaryFile("w", suffix=".ini", delete=False) as f:
+        f.write("[IP]\ntarget = 127.0.0.1:%d\n" % dock.getsockname()[1])
+        config_path = f.name
+
+    try:
+        interpreter = [interpreter_start() for _ in range(runs)]
+        payload = []
+        for _ in range(runs):
+            payload.append(first_payload(config_path, dock))
+            # Drop what the previous run still had in flight
+            dock.setblocking(False)
+            try:
+                while True: dock.recvfrom(65536)
+            except OSError: pass
+            dock.setblocking(True)
+        imports = [import_times("service") for _ in range(runs)]
+    finally:
+        dock.close()
+        os.unlink(config_path)
+
+    print(json.dumps({
+        "benchmark": "startup",
+        "runs": runs,
+        "interpreter_start_s": statistics.median(interpreter),
+        # Interpreter start, imports, configuration, first collection and send
+        "first_payload_s": statistics.median(payload),
+        "import_us": {module: statistics.median(run.get(module, 0) for run in imports)
+                      for module in MODULES if any(module in run for run in imports)}
+    }))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# Size and encode time of the binary wire format against today's JSON payload.
+#
+#   python benchmarks/bench_wire.py [iterations]
+#
+# Also checks that binary packets decode back to the original payload, and reports the size
+# of a typical delta (CPU and network rates changed, see delta.py).
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import wire
+from common import PAYLOAD
+
+TARGET = "192.168.1.30"
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations): fn()
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    device_info = dict(PAYLOAD, Target=TARGET)
+
+    json_packet = bytes(json.dumps(device_info), 'utf-8')
+    schema = wire.schema_for(device_info)
+    trailer = wire.TRAILER.pack(1)
+    binary_packet = schema.encode(device_info) + wire.target_ip(TARGET) + trailer
+
+    # Round trip through the reference decoder, as the dock sees it
+    schemas = {}
+    assert wire.decode(schema.announcement + trailer, schemas) is None
+    decoded = wire.decode(binary_packet, schemas)
+    assert decoded == device_info, decoded
+
+    changed = {"CPU": {"usage": (37, "%")}, "Network": {"up_rate": (12.5, "KB/s"), "dl_rate": (840.2, "KB/s")}}
+    json_delta = bytes(json.dumps(dict({"Delta": 1}, **changed, Target=TARGET)), 'utf-8')
+    binary_delta = schema.encode_delta(changed, 1) + wire.target_ip(TARGET) + trailer
+    assert wire.decode(binary_delta, schemas) == dict({"Delta": 1}, **changed, Target=TARGET)
+
+    print(json.dumps({
+        "benchmark": "wire",
+        "json_bytes": len(json_packet),
+        "binary_bytes": len(binary_packet),
+        "schema_bytes": len(schema.announcement),
+        "json_delta_bytes": len(json_delta),
+        "binary_delta_bytes": len(binary_delta),
+        "json_encode_s": measure(lambda: bytes(json.dumps(device_info), 'utf-8'), iterations),
+        "binary_encode_s": measure(lambda: schema.encode(device_info) + wire.target_ip(TARGET) + trailer, iterations),
+        "binary_decode_s": measure(lambda: wire.decode(binary_packet, schemas), iterations),
+        "json_decode_s": measure(lambda: json.loads(json_packet), iterations)
+    }))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+# Shared fixtures of the benchmarks
+
+# Representative device_info of one tick, as built by scheduler.Scheduler.collect()
+PAYLOAD = {
+    "Network": {"up_rate": (12.5, "KB/s"), "dl_rate": (840.1, "KB/s"), "uploaded": (1520.3, "MB"), "downloaded": (90210.7, "MB")},
+    "CPU": {"usage": (37, "%"), "temperature": (61, "°C")},
+    "GPU": {"usage": (12, "%"), "temperature": (48, "°C")},
+    "Memory": {"swap": (3, "%"), "usage": (41, "%"), "free": (9876, "MB"), "used": (6543, "MB")},
+    "Disk": {"usage": (63, "%"), "total": (953, "GB"), "used": (600, "GB"), "free": (353, "GB")},
+    "IP": "192.168.1.20"
+}
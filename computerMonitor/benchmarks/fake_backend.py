@@ -0,0 +1,93 @@
+# Deterministic sensor backend for the benchmarks, same interface as sensors/sensors_python.py.
+#
+# Values only depend on the tick number (advanced by begin_tick), nothing is read from the
+# machine, so timings and allocations measure stats.py / collector.py and not the hardware.
+# Installed with install(), which stands in for the lazily loaded backend of stats.py.
+
+import sys
+
+TICK = 0
+
+def begin_tick():
+    global TICK
+    TICK += 1
+
+def _wave(low, high, step):
+    # Triangle wave between low and high
+    span = high - low
+    position = (TICK * step) % (2 * span)
+    return low + (position if position <= span else 2 * span - position)
+
+
+class Cpu:
+    @staticmethod
+    def percentage(interval=None):
+        return (_wave(5, 95, 7), "%")
+
+    @staticmethod
+    def per_core():
+        return [(_wave(0, 100, 3 + core), "%") for core in range(8)]
+
+    @staticmethod
+    def temperature():
+        return (_wave(40, 85, 2), "°C")
+
+
+class Gpu:
+    @staticmethod
+    def stats():
+        return ((_wave(0, 100, 11), "%"), (_wave(35, 80, 1), "°C"))
+
+    @staticmethod
+    def devices():
+        return []
+
+    @staticmethod
+    def timings():
+        return {}
+
+
+class Memory:
+    @staticmethod
+    def stats():
+        used = 6000 + _wave(0, 4000, 50)
+        return ((3, "%"), (used, "MB"), (16000 - used, "MB"), (int(used / 160), "%"))
+
+
+class Disk:
+    @staticmethod
+    def stats():
+        return ((600, "GB"), (353, "GB"), (953, "GB"), (63, "%"))
+
+
+class Net:
+    @staticmethod
+    def stats(interval=None):
+        return {
+            "up_rate": (round(_wave(0, 500, 13) * 1.1, 1), "KB/s"),
+            "dl_rate": (round(_wave(0, 5000, 170) * 1.3, 1), "KB/s"),
+            "uploaded": (round(1520.3 + TICK * 0.1, 1), "MB"),
+            "downloaded": (round(90210.7 + TICK * 1.3, 1), "MB")
+        }
+
+
+def host_ip():
+    # Stands in for collector.get_host_ip, which resolves the host name
+    return "192.168.1.20"
+
+
+DISCOVERERS = {
+    "cpu_usage": lambda: Cpu.percentage,
+    "cpu_temperature": lambda: Cpu.temperature,
+    "gpu": lambda: Gpu.stats,
+    "memory": lambda: Memory.stats,
+    "disk": lambda: Disk.stats,
+    "network": lambda: Net.stats
+}
+
+def install(stats):
+    # Replace the backend of the stats module, whether or not the real one was loaded
+    global TICK
+    TICK = 0
+    stats.sensors = sys.modules[__name__]
+    stats._backend_loaded(stats.sensors)
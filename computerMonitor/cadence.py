@@ -0,0 +1,107 @@
+import math
+import wire
+import delta
+from collections import Counter
+
+# Adaptive push cadence (see udp_client.Engine): the payload is sampled every
+# `sample_interval` seconds but only pushed when a trigger fires, at most every
+# `min_interval` seconds, and at least every `max_interval` seconds as a heartbeat.
+# Triggers: the value moved by more than its threshold since the last push, or it crossed
+# one of its levels (e.g. CPU temperature going over 85 °C). A trigger that fires inside
+# min_interval is not lost: the first sample after min_interval is pushed.
+
+# Used when the [Cadence] section enables the mode without any trigger
+DEFAULT_THRESHOLDS = {
+    ("CPU", "usage"): 10.0,
+    ("CPU", "temperature"): 3.0,
+    ("GPU", "usage"): 10.0,
+    ("GPU", "temperature"): 3.0,
+    ("Memory", "usage"): 5.0
+}
+
+def levels_from_config(options):
+    # {"cpu.temperature.levels": "70, 85"} -> {("CPU", "temperature"): (70.0, 85.0)}
+    levels = {}
+    for option, value in options.items():
+        if not option.lower().endswith(".levels"): continue
+        field = wire.FIELD_NAMES.get(option.lower()[:-len(".levels")])
+        if field is None: continue
+        try:
+            levels[field] = tuple(sorted(float(level) for level in value.split(",") if level.strip()))
+        except ValueError:
+            print("Invalid levels '%s' for %s" % (value, option))
+    return levels
+
+def _number(device_info, field):
+    value = device_info.get(field[0], {}).get(field[1])
+    if isinstance(value, (tuple, list)): value = value[0]
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+
+class Cadence:
+    def __init__(self, sample_interval=0.5, min_interval=1, max_interval=30, thresholds=None, levels=None):
+        self.sample_interval = sample_interval
+        self.min_interval = min_interval # max rate
+        self.max_interval = max_interval # min rate, heartbeat of a stable machine
+        self.levels = levels or {}
+        self.thresholds = thresholds or ({} if self.levels else DEFAULT_THRESHOLDS)
+        self.fields = set(self.thresholds) | set(self.levels)
+        self.last = None # {field: value} of the last push
+        self.pushed_at = None
+        self.pending = None # reason of a trigger that fired inside min_interval, pushed when it ends
+        self.samples = 0
+        self.reasons = Counter() # pushes per reason: "first", "heartbeat" or the "Group.key" that triggered
+
+    def _trigger(self, values):
+        for field, value in values.items():
+            last = self.last[field]
+            if math.isnan(value) or math.isnan(last):
+                if math.isnan(value) != math.isnan(last): return field
+                continue
+            threshold = self.thresholds.get(field)
+            if threshold is not None and abs(value - last) > threshold: return field
+            low, high = min(value, last), max(value, last)
+            for level in self.levels.get(field, ()):
+                if low < level <= high: return field
+        return None
+
+    def due(self, device_info, now):
+        # True when this sample is pushed
+        self.samples += 1
+        values = {field: _number(device_info, field) for field in self.fields}
+        if self.last is None:
+            reason = "first"
+        else:
+            if self.pending is None:
+                # A trigger inside min_interval is latched and pushed once min_interval has passed
+                field = self._trigger(values)
+                if field is not None: self.pending = "%s.%s" % field
+            if now - self.pushed_at < self.min_interval:
+                return False
+            if self.pending is not None:
+                reason = self.pending
+            elif now - self.pushed_at >= self.max_interval - self.sample_interval / 2:
+                # The heartbeat sample may be scheduled a hair early
+                reason = "heartbeat"
+            else:
+                return False
+        self.last = values
+        self.pushed_at = now
+        self.pending = None
+        self.reasons[reason] += 1
+        return True
+
+    def summary(self):
+        pushes = sum(self.reasons.values())
+        reasons = ", ".join("%s %d" % item for item in self.reasons.most_common())
+        return "pushed %d of %d samples (%s)" % (pushes, self.samples, reasons)
+
+
+def from_config(config):
+    # Cadence from the [Cadence] section, None unless enabled
+    if not config.getboolean("Cadence", "enabled", fallback=False): return None
+    options = dict(config.items("Cadence"))
+    return Cadence(config.getfloat("Cadence", "sample_interval", fallback=0.5),
+                   config.getfloat("Cadence", "min_interval", fallback=1),
+                   config.getfloat("Cadence", "max_interval", fallback=30),
+                   delta.thresholds_from_config(options), levels_from_config(options))
@@ -0,0 +1,56 @@
+import wire
+import socket
+from stats import CPU, Gpu, Memory, Disk, Net
+
+def get_cpu_info(usage, temperature):
+    return {
+        "usage": usage, # CPU usage
+        "temperature": temperature # CPU temperature
+    }
+
+def read_cpu_info():
+    usage = CPU.percentage()
+    # Kept in CPU.cores for the metrics endpoint, the payload only carries the total
+    CPU.per_core()
+    return get_cpu_info(usage, CPU.temperature())
+
+def get_gpu_info(info):
+    return {
+        "usage": info[0], # GPU usage
+        "temperature": info[1] # GPU temperature
+    }
+
+def get_memory_info(info):
+    return {
+        "swap": info[0], # Percentage of current system swap space usage
+        "usage": info[3], # Percentage of current system memory usag
+        "free": info[2], # Available memory amount in the current system
+        "used": info[1], # Used memory amount in the current system
+    }
+
+def get_disk_info(info):
+    return {
+        "usage": info[3], # Disk usage
+        "total": info[2], # Total size of the disk
+        "used": info[0], # Used size of the disk
+        "free": info[1] # Available size of the disk
+    }
+
+def get_host_ip():
+    return socket.gethostbyname(socket.gethostname())
+
+# Readers of each payload group on its own, in payload order. scheduler.Scheduler.collect
+# builds the payload of a tick from them, each metric source is read once per group read.
+GROUPS = (
+    ("Network", Net.stats),
+    ("CPU", read_cpu_info),
+    ("GPU", lambda: get_gpu_info(Gpu.stats())),
+    ("Memory", lambda: get_memory_info(Memory.stats())),
+    ("Disk", lambda: get_disk_info(Disk.stats())),
+    ("IP", get_host_ip)
+)
+
+# Value of a group that was never read successfully, see scheduler.py
+PLACEHOLDERS = {name: {} for name, _ in GROUPS}
+for group, key, unit, _, _ in wire.FIELDS: PLACEHOLDERS[group][key] = ("-", unit)
+PLACEHOLDERS["IP"] = "-"
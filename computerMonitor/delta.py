@@ -0,0 +1,90 @@
+import math
+import wire
+
+# Keyframe + delta payload mode, negotiated per dock (see udp_client.Engine).
+#
+# A keyframe is the full payload tagged with a keyframe sequence number. In between, a
+# delta only carries the fields that moved beyond their threshold since that keyframe,
+# tagged with the same sequence number. Deltas are relative to the keyframe and not to
+# the previous delta, so losing a delta loses nothing. A dock that missed the keyframe
+# asks for a new one ({"code": 409, "delta": 1, "keyframe": true}); a keyframe also goes out every
+# `interval` pushes, and when a field of the keyframe is no longer in the payload.
+
+def thresholds_from_config(options):
+    # {"cpu.usage": "2", "memory.free": "64"} -> {("CPU", "usage"): 2.0, ("Memory", "free"): 64.0}
+    thresholds = {}
+    for option, value in options.items():
+        field = wire.FIELD_NAMES.get(option.lower())
+        if field is None: continue
+        try:
+            thresholds[field] = float(value)
+        except ValueError:
+            print("Invalid threshold '%s' for %s" % (value, option))
+    return thresholds
+
+
+class KeyframeDelta:
+    def __init__(self, interval=12, thresholds=None):
+        self.interval = interval # pushes between two keyframes
+        self.thresholds = thresholds or {} # {(group, key): minimum change}, 0 by default
+        self.seq = 0 # sequence number of the current keyframe, 16 bit
+        self.reference = None # {(group, key) or (group,): value} of the current keyframe
+        self.since = 0 # deltas sent since the keyframe
+        self.requested = False
+
+    def request(self):
+        # A keyframe goes out on the next tick
+        self.requested = True
+
+    def _changed(self, field, value, reference):
+        if isinstance(value, (tuple, list)): value = value[0]
+        if isinstance(reference, (tuple, list)): reference = reference[0]
+        if isinstance(value, (int, float)) and isinstance(reference, (int, float)):
+            if math.isnan(value) or math.isnan(reference): return not (math.isnan(value) and math.isnan(reference))
+            return abs(value - reference) > self.thresholds.get(field, 0)
+        return value != reference
+
+    def next(self, device_info):
+        # (keyframe?, sequence number, payload): the full payload or the changed fields only
+        if self.reference is None or self.requested or self.since >= self.interval:
+            self.seq = (self.seq + 1) & 0xFFFF
+            self.since = 0
+            self.requested = False
+            self.reference = {}
+            for group, fields in device_info.items():
+                if isinstance(fields, dict):
+                    for key, value in fields.items(): self.reference[(group, key)] = value
+                else:
+                    self.reference[(group,)] = fields
+            return (True, self.seq, device_info)
+
+        changed = {}
+        present = 0 # fields of the keyframe still in the payload
+        for group, fields in device_info.items():
+            if isinstance(fields, dict):
+                for key, value in fields.items():
+                    field = (group, key)
+                    if field not in self.reference:
+                        changed.setdefault(group, {})[key] = value
+                        continue
+                    present += 1
+                    if self._changed(field, value, self.reference[field]):
+                        changed.setdefault(group, {})[key] = value
+            elif (group,) not in self.reference:
+                changed[group] = fields
+            else:
+                present += 1
+                if fields != self.reference[(group,)]: changed[group] = fields
+        if present < len(self.reference):
+            # A delta cannot remove a field (e.g. "Stale" once the groups recovered)
+            self.request()
+            return self.next(device_info)
+        self.since += 1
+        return (False, self.seq, changed)
+
+
+def from_config(config):
+    # KeyframeDelta from the [Delta] section, None unless enabled
+    if not config.getboolean("Delta", "enabled", fallback=False): return None
+    options = dict(config.items("Delta"))
+    return KeyframeDelta(config.getint("Delta", "keyframe_interval", fallback=12), thresholds_from_config(options))
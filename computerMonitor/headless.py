@@ -0,0 +1,67 @@
+import sys
+import signal
+import argparse
+import recording
+import udp_client
+from service import CONFIGURATION_FILE_PATH, Configuration, ConfigError, load_configuration, create_engine
+
+# Headless entry point: same collection and send loop as the GUI, without tkinter.
+# Logs to stdout (the journal under systemd) and stops cleanly on SIGTERM / SIGINT.
+#
+#   python headless.py --config /etc/computer-monitor.ini
+#   python headless.py --target "192.168.1.10, 192.168.1.11:32124"
+
+def log(line):
+    print(line, flush=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Send this computer's hardware information to Vobot Mini Docks.")
+    parser.add_argument("-c", "--config", default=CONFIGURATION_FILE_PATH,
+                        help="configuration file, same format as the GUI's (default: %(default)s)")
+    parser.add_argument("-t", "--target", help="docks as \"ip[:port], ...\", overrides [IP] target")
+    parser.add_argument("--report-interval", type=float, default=udp_client.Engine.report_interval,
+                        help="seconds between two statistics lines per dock (default: %(default)s)")
+    parser.add_argument("-r", "--record", help="append every sent payload to this recording, overrides [Record] path")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every acked packet")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = Configuration()
+    if not load_configuration(config, args.config) and args.config != CONFIGURATION_FILE_PATH:
+        log(f"Configuration file {args.config} not found.")
+        return 2
+
+    targets = args.target or config.get("IP", "target", fallback="")
+    try:
+        udp_client.parse_targets(targets)
+    except ValueError as e:
+        log(f"Invalid target [{e}], set [IP] target in {args.config} or pass --target.")
+        return 2
+    if args.record:
+        if not config.has_section("Record"): config.add_section("Record")
+        config.set("Record", "path", args.record)
+    try:
+        engine = create_engine(config, targets, log=log)
+    except recording.RecordingError as e:
+        log(f"{e}, check [Record] path in {args.config} or --record.")
+        return 2
+    except ConfigError as e:
+        log(f"Invalid {e.option} in the [{e.section}] section of {args.config} [{e.error}].")
+        return 2
+    engine.report_interval = args.report_interval
+    engine.log_success = args.verbose
+
+    def stop(signum, frame):
+        log(f"Stopping ({signal.Signals(signum).name}).")
+        engine.stop()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    log(f"Target device IP: {targets}")
+    # Blocks until stop(), then logs the final statistics
+    engine.run_forever()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import math
+import wire
+from array import array
+from collections import Counter, deque
+
+# Fixed-memory metric history: one preallocated array('f') ring per numeric payload field,
+# fed with every collected sample (see udp_client.Engine). Each ring keeps rolling
+# statistics over one or more windows, updated in O(1) per sample:
+# - mean: running sum of the window
+# - min / max: monotonic deques (amortised O(1), at most one entry per sample in the window)
+# - p95: histogram of logarithmic buckets GROWTH apart, so within ~1% of the exact value
+# Memory does not grow with uptime: rings, deques and histograms are bounded by the window.
+# Selected fields can carry their statistics and a down-sampled sparkline in the payload's
+# "History", so the dock can draw trends without keeping history itself.
+
+GROWTH = 1.02
+ZERO_BUCKET = -(1 << 30) # values <= 0
+
+def _bucket(value):
+    return math.floor(math.log(value, GROWTH)) if value > 0 else ZERO_BUCKET
+
+
+class Window:
+    # Rolling statistics of the last `size` samples
+    def __init__(self, size):
+        self.size = size
+        self.count = 0 # samples in the window that have a value (not NaN)
+        self.total = 0.0
+        self.mins = deque() # (index, value), increasing values
+        self.maxs = deque() # (index, value), decreasing values
+        self.buckets = Counter()
+
+    def add(self, index, value, evicted):
+        # index: position of the sample in the stream, evicted: sample leaving the window or None
+        if evicted is not None and not math.isnan(evicted):
+            self.count -= 1
+            self.total -= evicted
+            bucket = _bucket(evicted)
+            self.buckets[bucket] -= 1
+            if not self.buckets[bucket]: del self.buckets[bucket]
+        oldest = index - self.size
+        while self.mins and self.mins[0][0] <= oldest: self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= oldest: self.maxs.popleft()
+        if math.isnan(value): return
+
+        self.count += 1
+        self.total += value
+        self.buckets[_bucket(value)] += 1
+        while self.mins and self.mins[-1][1] >= value: self.mins.pop()
+        self.mins.append((index, value))
+        while self.maxs and self.maxs[-1][1] <= value: self.maxs.pop()
+        self.maxs.append((index, value))
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, within [min, max]
+        if not self.count: return math.nan
+        rank = self.count * (100 - p) / 100
+        above = 0
+        for bucket in sorted(self.buckets, reverse=True):
+            above += self.buckets[bucket]
+            if above > rank or bucket == ZERO_BUCKET:
+                value = 0.0 if bucket == ZERO_BUCKET else GROWTH ** (bucket + 1)
+                return min(max(value, self.mins[0][1]), self.maxs[0][1])
+        return self.mins[0][1]
+
+    def stats(self):
+        # (min, max, mean, p95), NaN without any value
+        if not self.count: return (math.nan,) * 4
+        return (self.mins[0][1], self.maxs[0][1], self.total / self.count, self.percentile(95))
+
+
+class Ring:
+    def __init__(self, capacity, windows):
+        self.capacity = max([capacity] + list(windows))
+        self.values = array('f', [math.nan]) * self.capacity
+        self.index = 0 # samples added so far
+        self.windows = {size: Window(size) for size in windows}
+
+    def add(self, value):
+        evicted = {size: self.values[(self.index - size) % self.capacity] if self.index >= size else None
+                   for size in self.windows}
+        self.values[self.index % self.capacity] = value
+        # The windows see the stored float32, the same value they get back when it is evicted
+        value = self.values[self.index % self.capacity]
+        for size, window in self.windows.items():
+            window.add(self.index, value, evicted[size])
+        self.index += 1
+        for size, window in self.windows.items():
+            # Drop the rounding drift of the running sum once per window, amortised O(1)
+            if self.index % size == 0:
+                window.total = sum(value for value in self.last(size) if not math.isnan(value))
+
+    def last(self, count):
+        # Up to `count` most recent samples, oldest first
+        count = min(count, self.index, self.capacity)
+        start = (self.index - count) % self.capacity
+        if start + count <= self.capacity: return self.values[start:start + count]
+        return self.values[start:] + self.values[:start + count - self.capacity]
+
+    def sparkline(self, samples, points):
+        # Means of `points` consecutive slices of the last `samples` samples, None where empty
+        values = self.last(samples)
+        points = min(points, len(values))
+        line = []
+        for i in range(points):
+            chunk = [value for value in values[i * len(values) // points:(i + 1) * len(values) // points]
+                     if not math.isnan(value)]
+            line.append(sum(chunk) / len(chunk) if chunk else None)
+        return line
+
+
+def _number(value):
+    if isinstance(value, (tuple, list)): value = value[0]
+    return float(value) if isinstance(value, (int, float)) else math.nan
+
+def _round(value, decimals):
+    if value is None or math.isnan(value): return None
+    return int(round(value)) if decimals == 0 else round(value, decimals)
+
+
+class History:
+    def __init__(self, capacity=720, windows=(12, 60), attach=(), points=24, interval=5):
+        # windows: sizes in samples, attach: [(group, key)] sent in the payload's "History"
+        self.windows = tuple(windows)
+        self.interval = interval # seconds per sample, to label the windows
+        self.rings = {(group, key): Ring(capacity, self.windows) for group, key, _, _, _ in wire.FIELDS}
+        self.decimals = {(group, key): decimals for group, key, _, _, decimals in wire.FIELDS}
+        self.attach = [field for field in attach if field in self.rings]
+        self.points = points
+
+    def record(self, device_info):
+        # Adds one sample, returns the payload with "History" attached when configured
+        for (group, key), ring in self.rings.items():
+            ring.add(_number(device_info.get(group, {}).get(key)))
+        if not self.attach: return device_info
+
+        history = {}
+        for field in self.attach:
+            ring = self.rings[field]
+            decimals = self.decimals[field]
+            entry = {}
+            for size in self.windows:
+                # "300": [min, max, mean, p95] over the last 300 s
+                entry["%g" % (size * self.interval)] = [_round(value, decimals) for value in ring.windows[size].stats()]
+            entry["spark"] = [_round(value, decimals) for value in ring.sparkline(max(self.windows), self.points)]
+            history.setdefault(field[0], {})[field[1]] = entry
+        return dict(device_info, History=history)
+
+    def stats(self, group, key, size):
+        # (min, max, mean, p95) of a field over the window of `size` samples
+        return self.rings[(group, key)].windows[size].stats()
+
+
+def from_config(config, interval=5):
+    # History from the [History] section (windows in seconds), None unless enabled
+    if not config.getboolean("History", "enabled", fallback=False): return None
+    try:
+        windows = [max(1, round(float(seconds) / interval))
+                   for seconds in config.get("History", "windows", fallback="60, 300").split(",") if seconds.strip()]
+    except ValueError:
+        print("Invalid history windows, expected seconds separated by commas")
+        windows = [max(1, round(60 / interval)), max(1, round(300 / interval))]
+    attach = []
+    for name in config.get("History", "attach", fallback="").split(","):
+        field = wire.FIELD_NAMES.get(name.strip().lower())
+        if field is not None: attach.append(field)
+        elif name.strip(): print("Unknown history field '%s'" % name.strip())
+    return History(config.getint("History", "capacity", fallback=720), windows or [1], attach,
+                   config.getint("History", "sparkline_points", fallback=24), interval)
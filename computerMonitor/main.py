@@ -1,94 +1,44 @@
-import re
-import os
-import sys
-import json
-import time
-import platform
 import datetime
-import socket
 import threading
+from collections import deque
 import udp_client
-import configparser
-from stats import *
+from service import CONFIGURATION_FILE_PATH, Configuration, load_configuration, create_engine
 import tkinter as tk
 from tkinter import messagebox
 
-EXE_PATH = os.path.dirname(sys.executable)
-
-if platform.system() not in ("Windows", "Linux"): # MAC
-    dirs = []
-    for dir_name in EXE_PATH.split("/"):
-        if dir_name.endswith(".app"): break
-        dirs.append(dir_name)
-    EXE_PATH = "/".join(dirs)
-
-CONFIGURATION_FILE_PATH = EXE_PATH + "/configuration.ini"
-
-def is_valid_ip(ip):
-    # Regular expression pattern for IP address
-    pattern = r'^((?:(?:25[0-5]|2[0-4]\d|((1\d{2})|([1-9]?\d)))\.){3}(?:25[0-5]|2[0-4]\d|((1\d{2})|([1-9]?\d))))$'
-
-    # Match the pattern using the match() method from re module
-    if re.match(pattern, ip):
-        # IP address format is valid
-        return True
-    else:
-        # IP address format is invalid
-        return False
-
-def get_cpu_info():
-    return {
-        "usage": CPU.percentage(), # CPU usage
-        "temperature": CPU.temperature() # CPU temperature
-    }
-
-def get_gpu_info():
-    info = Gpu.stats()
-    return {
-        "usage": info[0], # GPU usage
-        "temperature": info[1] # GPU temperature
-    }
-
-def get_memory_info():
-    info = Memory.stats()
-    return {
-        "swap": info[0], # Percentage of current system swap space usage
-        "usage": info[3], # Percentage of current system memory usag
-        "free": info[2], # Available memory amount in the current system
-        "used": info[1], # Used memory amount in the current system
-    }
-
-def get_disk_info():
-    info = Disk.stats()
-    return {
-        "usage": info[3], # Disk usage
-        "total": info[2], # Total size of the disk
-        "used": info[0], # Used size of the disk
-        "free": info[1] # Available size of the disk
-    }
+LOG_LINES = 500 # lines kept in the log widget, and waiting to be shown
+LOG_FLUSH_MS = 250 # period of the batched log updates
 
 class GUI:
 
     def __init__(self):
-        self.T = None
+        self.run = None # current Start, see broadcast()
+        self.lock = threading.Lock()
         self.device_ip = ""
         self.root = tk.Tk()
         self.root.title('Computer Monitor')
-        self.running = False
-        self.config = configparser.ConfigParser()
+        self.config = Configuration()
+        # Lines logged from any thread, shown by flush_log() on the Tk thread.
+        # Bounded: the oldest lines are dropped when the widget is not keeping up.
+        self.log_lines = deque(maxlen=LOG_LINES)
+        self.log_job = None
 
         self.load_configuration()
         self.initial_interface()
 
     def load_configuration(self):
-        self.config.read(CONFIGURATION_FILE_PATH)
+        load_configuration(self.config)
         for section in self.config.sections():
             if section != "IP": continue
             for option in self.config.options(section):
                 if option != "target": continue
+                # One or more docks: "192.168.1.10, 192.168.1.11:32124"
                 self.device_ip = self.config.get(section, option)
 
-                if not is_valid_ip(self.device_ip): self.device_ip = ""
+                try:
+                    udp_client.parse_targets(self.device_ip)
+                except ValueError:
+                    self.device_ip = ""
                 return
 
     def save_configuration(self):
@@ -121,10 +71,21 @@ class GUI:
         btn.place(x=228, y=74, width=70, height=25)
 
     def log(self, line):
-        try:
-            ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.log_text.insert(1.0, f'{ts}: {line}\n')
-        except: pass
+        # Thread-safe, no Tk call here
+        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.log_lines.append(f'{ts}: {line}\n')
+
+    def flush_log(self):
+        # Shows the pending lines in one insert, newest first, and keeps LOG_LINES lines
+        lines = []
+        while self.log_lines:
+            lines.append(self.log_lines.popleft())
+        if lines:
+            try:
+                self.log_text.insert(1.0, "".join(reversed(lines)))
+                self.log_text.delete(f"{LOG_LINES + 1}.0", tk.END)
+            except: pass
+        self.log_job = self.root.after(LOG_FLUSH_MS, self.flush_log)
 
     def run_interface(self):
         # Interface during runtime
@@ -134,61 +95,63 @@ class GUI:
         self.log_text = tk.Text(self.root)
         self.log_text.place(x=0, y=0, width=600, height=160)
         self.log_text.bind("<KeyPress>", lambda e: "break")
+        self.log_lines.clear()
         self.log(f'Target device IP: {self.device_ip}')
+        self.flush_log()
 
         btn = tk.Button(self.root, text="Stop", takefocus=False, command=self.stop)
         btn.place(x=260, y=161, width=80, height=25)
 
     def win_clean(self):
+        if self.log_job is not None:
+            self.root.after_cancel(self.log_job)
+            self.log_job = None
         for widget in self.root.winfo_children():
             widget.destroy()
 
-    def broadcast(self):
-        udp_client.init()
-        # Put the application in the background
-        # self.root.withdraw()
-
-        # Minimize the window
-        self.root.iconify()
-        while self.running:
-            try:
-                text = ""
-                try:
-                    device_info = {
-                        "Network": Net.stats(),
-                        "CPU": get_cpu_info(),
-                        "GPU": get_gpu_info(),
-                        "Memory": get_memory_info(),
-                        "Disk": get_disk_info(),
-                        "Target": self.device_ip,
-                        "IP": socket.gethostbyname(socket.gethostname())
-                    }
-                    text = udp_client.send(bytes(json.dumps(device_info), 'utf-8'))
-                except Exception as e:
-                    text = "Fail to send [" + str(e) + "]."
-                self.log(text)
-                time.sleep(5)
-            except RuntimeError:
-                break
-        self.T = None
+    def broadcast(self, run):
+        # run: {"stopped": bool, "engine": Engine} of one Start, ended by stop(). The engine
+        # of a previous Start may still be finishing its tick on another thread.
+        try:
+            engine = create_engine(self.config, self.device_ip, log=self.log)
+        except Exception as e:
+            # e.g. a [Record] path that cannot be written, Start can be tried again
+            self.log(f"Cannot start [{e}].")
+            return
+        with self.lock:
+            run["engine"] = engine
+            if run["stopped"]: engine.stop()
+        # Blocks this thread until stop()
+        engine.run_forever()
 
     def start(self):
-        self.device_ip = self.ip_entry.get()
-        if is_valid_ip(self.device_ip):
+        self.device_ip = self.ip_entry.get().strip()
+        try:
+            udp_client.parse_targets(self.device_ip)
+            valid = True
+        except ValueError:
+            valid = False
+        if valid:
             self.save_configuration()
-            udp_client.unicast_ip = self.device_ip
             self.win_clean()
-            self.running = True
             self.run_interface()
-            if self.T is None:
-                self.T = threading.Thread(target=self.broadcast)
-                self.T.start()
+            # Put the application in the background
+            # self.root.withdraw()
+
+            # Minimize the window
+            self.root.iconify()
+            self.run = {"stopped": False, "engine": None}
+            threading.Thread(target=self.broadcast, args=(self.run,)).start()
         else:
             self.ip_entry.delete(0,tk.END)
-            messagebox.showwarning("Invalid IP", "IP format error, please try again")
+            messagebox.showwarning("Invalid IP", "IP format error, please try again\n(separate several docks with commas)")
 
     def stop(self):
-        self.running = False
+        with self.lock:
+            if self.run is not None:
+                self.run["stopped"] = True
+                if self.run["engine"] is not None: self.run["engine"].stop()
+                self.run = None
         self.win_clean()
         self.initial_interface()
 
@@ -0,0 +1,194 @@
+import math
+import wire
+import stats
+import asyncio
+
+# Local OpenMetrics (Prometheus) endpoint serving the last collected payload, so a scraper
+# does not need its own exporter reading the same hardware. Runs on the Engine's event loop:
+# update() is called once per tick with the payload the tick collected anyway, and the body
+# is rendered on the first scrape after that and cached until the next tick.
+
+CONTENT_TYPE = b"application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "computer_monitor_"
+
+# Payload unit -> (metric unit suffix, factor to the base unit)
+UNITS = {
+    "%": ("ratio", 0.01),
+    "°C": ("celsius", 1),
+    "°": ("celsius", 1),
+    "MB": ("bytes", 1024.0 ** 2),
+    "GB": ("bytes", 1024.0 ** 3),
+    "KB/s": ("bytes_per_second", 1024.0)
+}
+
+# Device field -> (metric name, unit suffix, factor to the base unit) of the per-GPU gauges
+GPU_DEVICE_FIELDS = (("utilization", "gpu_device_utilization", "ratio", 0.01),
+                     ("memory_used", "gpu_device_memory_used", "bytes", 1024.0 ** 2),
+                     ("memory_total", "gpu_device_memory_total", "bytes", 1024.0 ** 2),
+                     ("temperature", "gpu_device_temperature", "celsius", 1))
+
+# Cumulative payload fields, exposed as counters
+COUNTERS = {("Network", "uploaded"): "network_transmit", ("Network", "downloaded"): "network_receive"}
+
+def _number(value):
+    if isinstance(value, (tuple, list)): value = value[0]
+    return float(value) if isinstance(value, (int, float)) and not math.isnan(value) else None
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format(value):
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+
+class MetricsEndpoint:
+    def __init__(self, host="127.0.0.1", port=9101, scheduler=None):
+        self.host = host
+        self.port = port
+        self.scheduler = scheduler # scheduler.Scheduler, for the collection timings
+        self.device_info = None
+        self.engine = None
+        self.body = None # rendered body of the last tick, None until the next scrape
+        self.renders = 0
+        self.scrapes = 0
+        self.server = None
+
+    async def open(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+
+    def close(self):
+        if self.server is not None: self.server.close()
+
+    def update(self, device_info, engine):
+        # Called once per tick, no sensor is read here
+        self.device_info = device_info
+        self.engine = engine
+        self.body = None
+
+    def render(self):
+        if self.body is None:
+            self.renders += 1
+            lines = []
+            if self.device_info is not None:
+                self._payload(lines)
+                self._cpu_cores(lines)
+                self._gpu_devices(lines)
+            self._monitor(lines)
+            lines.append("# EOF\n")
+            self.body = "\n".join(lines).encode()
+        return self.body
+
+    def _payload(self, lines):
+        for group, key, default_unit, _, _ in wire.FIELDS:
+            item = self.device_info.get(group, {}).get(key)
+            value = _number(item)
+            if value is None: continue
+            unit = item[1] if isinstance(item, (tuple, list)) and len(item) > 1 else default_unit
+            suffix, factor = UNITS.get(unit, ("", 1))
+            counter = COUNTERS.get((group, key))
+            if counter is not None:
+                name = PREFIX + counter + "_" + suffix
+                lines += [f"# TYPE {name} counter", f"# UNIT {name} {suffix}", f"{name}_total {_format(value * factor)}"]
+            else:
+                name = PREFIX + f"{group}_{key}".lower() + ("_" + suffix if suffix else "")
+                lines += [f"# TYPE {name} gauge"] + ([f"# UNIT {name} {suffix}"] if suffix else []) + [f"{name} {_format(value * factor)}"]
+        stale = set(self.device_info.get("Stale", ()))
+        if self.scheduler is not None:
+            name = PREFIX + "group_stale"
+            lines.append(f"# TYPE {name} gauge")
+            for group in self.scheduler.groups:
+                lines.append(f'{name}{{group="{_label(group.name)}"}} {int(group.name in stale)}')
+
+    def _cpu_cores(self, lines):
+        # Per-core usage read with the CPU group of the last tick
+        cores = [(core, _number(item)) for core, item in enumerate(stats.CPU.cores)]
+        cores = [(core, value) for core, value in cores if value is not None]
+        if not cores: return
+        name = PREFIX + "cpu_core_usage_ratio"
+        lines += [f"# TYPE {name} gauge", f"# UNIT {name} ratio"]
+        for core, value in cores:
+            lines.append(f'{name}{{core="{core}"}} {_format(value * 0.01)}')
+
+    def _gpu_devices(self, lines):
+        # Per-device stats of the GPU read of the last tick; the payload only carries one GPU
+        devices = stats.Gpu.devices()
+        for field, metric, suffix, factor in GPU_DEVICE_FIELDS:
+            samples = [(device, _number(getattr(device, field))) for device in devices]
+            samples = [(device, value) for device, value in samples if value is not None]
+            if not samples: continue
+            name = PREFIX + metric + "_" + suffix
+            lines += [f"# TYPE {name} gauge", f"# UNIT {name} {suffix}"]
+            for device, value in samples:
+                lines.append(f'{name}{{gpu="{device.index}",name="{_label(device.name)}"}} {_format(value * factor)}')
+
+    def _monitor(self, lines):
+        # The monitor's own collection and send statistics
+        if self.scheduler is not None:
+            groups = self.scheduler.groups
+            for metric, attribute, kind in (("group_reads", "reads", "counter"), ("group_read_seconds", "read_total", "counter"),
+                                            ("group_timeouts", "timeouts", "counter"), ("group_overruns", "overruns", "counter"),
+                                            ("group_errors", "errors", "counter"), ("group_period_seconds", "period", "gauge")):
+                name = PREFIX + metric
+                lines.append(f"# TYPE {name} {kind}")
+                for group in groups:
+                    lines.append(f'{name}{"_total" if kind == "counter" else ""}{{group="{_label(group.name)}"}} {_format(getattr(group, attribute))}')
+
+        timings = stats.Gpu.timings()
+        for key in ("probe", "query"):
+            if timings.get(key) is None: continue
+            name = PREFIX + f"gpu_{key}_seconds"
+            lines += [f"# TYPE {name} gauge", f"# UNIT {name} seconds",
+                      f'{name}{{backend="{_label(timings.get("backend", ""))}"}} {_format(timings[key])}']
+
+        if self.engine is not None:
+            if self.engine.collect_seconds is not None:
+                name = PREFIX + "collect_seconds"
+                lines += [f"# TYPE {name} gauge", f"# UNIT {name} seconds", f"{name} {_format(self.engine.collect_seconds)}"]
+            for metric, attribute in (("packets_sent", "sent"), ("packets_acked", "acked"), ("packets_lost", "timeouts"),
+                                      ("acks_late", "late"), ("resend_requests", "requests"),
+                                      ("send_errors", "errors")):
+                name = PREFIX + metric
+                lines.append(f"# TYPE {name} counter")
+                for target in self.engine.targets:
+                    lines.append(f'{name}_total{{target="{_label(target)}"}} {getattr(target, attribute)}')
+            name = PREFIX + "ack_rtt_seconds"
+            lines += [f"# TYPE {name} histogram", f"# UNIT {name} seconds"]
+            for target in self.engine.targets:
+                label = f'target="{_label(target)}"'
+                rtt = target.rtt
+                cumulative = 0
+                for bound, count in zip(rtt.bounds, rtt.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {rtt.count}')
+                lines.append(f"{name}_count{{{label}}} {rtt.count}")
+                lines.append(f"{name}_sum{{{label}}} {_format(rtt.total / 1000)}")
+
+        name = PREFIX + "metrics_renders"
+        lines += [f"# TYPE {name} counter", f"{name}_total {self.renders}"]
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            method, path = (request.split(b" ", 2) + [b"", b""])[:2]
+            if method not in (b"GET", b"HEAD"):
+                status, body, content_type = b"405 Method Not Allowed", b"", b"text/plain"
+            elif path.split(b"?")[0] != b"/metrics":
+                status, body, content_type = b"404 Not Found", b"", b"text/plain"
+            else:
+                self.scrapes += 1
+                status, body, content_type = b"200 OK", self.render(), CONTENT_TYPE
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: " + content_type +
+                         b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n")
+            if method != b"HEAD": writer.write(body)
+            await writer.drain()
+        except Exception: pass
+        finally:
+            writer.close()
+
+
+def from_config(config, scheduler=None):
+    # MetricsEndpoint from the [Metrics] section, None unless enabled
+    if not config.getboolean("Metrics", "enabled", fallback=False): return None
+    return MetricsEndpoint(config.get("Metrics", "host", fallback="127.0.0.1"),
+                           config.getint("Metrics", "port", fallback=9101), scheduler)
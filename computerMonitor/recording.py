@@ -0,0 +1,107 @@
+import json
+import mmap
+import time
+import struct
+
+# Append-only recording of the sent payloads, replayed by replay.py.
+#
+# File: HEADER (magic, format version, wall clock time of the start of the recording),
+# then one record per push: RECORD (payload length, seconds since the start of the
+# recording on the monotonic clock) followed by the payload as UTF-8 JSON. Payloads are
+# recorded as JSON whatever wire format the docks get, and encoded again on replay.
+# Records are only ever appended, so a recording can be read (memory-mapped) while it is
+# written, and a record cut short by a crash only loses itself.
+
+MAGIC = b"VBREC"
+VERSION = 1
+HEADER = struct.Struct("<5sBd")
+RECORD = struct.Struct("<Id")
+
+
+class RecordingError(OSError):
+    # The recording file cannot be opened or continued, the message says why
+    pass
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.file = open(path, "ab")
+        except OSError as e:
+            raise RecordingError(f"Cannot open the recording {path} ({e.strerror or e})") from e
+        try:
+            self.start = self._resume()
+        except Exception as e:
+            self.file.close()
+            if isinstance(e, RecordingError): raise
+            raise RecordingError(f"Cannot continue the recording {path} ({e})") from e
+        self.records = 0
+
+    def _resume(self):
+        # Start of the timeline on the monotonic clock
+        if self.file.tell() < HEADER.size:
+            # New file, or a header cut short by a crash: start over
+            with open(self.path, "rb") as f: head = f.read(len(MAGIC))
+            if not MAGIC.startswith(head): raise RecordingError(f"{self.path} is not a recording")
+            self.file.truncate(0)
+            self.file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+            self.file.flush()
+            return time.monotonic()
+
+        # Appending to an existing recording: drop a record cut short by a crash and
+        # continue the timeline after the last complete one
+        last, end = 0.0, HEADER.size
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                try:
+                    for last, _, end in records(data): pass
+                except ValueError as e:
+                    raise RecordingError(f"{self.path}: {e}") from e
+        self.file.truncate(end)
+        self.file.seek(end)
+        return time.monotonic() - last
+
+    def append(self, device_info, now=None):
+        payload = json.dumps(device_info, separators=(",", ":")).encode()
+        offset = (time.monotonic() if now is None else now) - self.start
+        self.file.write(RECORD.pack(len(payload), offset) + payload)
+        # One record per push: flushed so an incident is on disk even if the monitor dies
+        self.file.flush()
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(data):
+    if len(data) < HEADER.size: raise ValueError("not a recording (too short)")
+    magic, version, started = HEADER.unpack_from(data)
+    if magic != MAGIC: raise ValueError("not a recording")
+    if version != VERSION: raise ValueError("unsupported recording version %d" % version)
+    return started
+
+def records(data):
+    # (seconds since the start, payload start, payload end) of each complete record of a
+    # buffer / mmap, without copying the payloads
+    read_header(data)
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        length, timestamp = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data): break
+        yield (timestamp, offset, offset + length)
+        offset += length
+
+def read(path):
+    # (seconds since the start, device_info) of each record, the file is memory-mapped
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for timestamp, start, end in records(data):
+                yield (timestamp, json.loads(data[start:end]))
+
+
+def from_config(config):
+    # Recorder from the [Record] section, None without a path
+    path = config.get("Record", "path", fallback="").strip()
+    return Recorder(path) if path else None
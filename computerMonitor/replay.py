@@ -0,0 +1,111 @@
+import sys
+import json
+import math
+import time
+import signal
+import asyncio
+import argparse
+import udp_client
+import recording
+
+# Streams a recording (see recording.py) to one or more docks through udp_client.Engine,
+# at the recorded pace, N times faster, or as fast as possible. At maximum speed the
+# summary doubles as a throughput benchmark of the send path and of the dock.
+#
+#   python replay.py incident.vbrec --target 192.168.1.10 --speed 10
+#   python replay.py incident.vbrec --target 192.168.1.10 --speed max --loop 20
+#
+# Records hold the payloads as JSON (see recording.py); the Engine encodes each one again
+# on its way out, binary wire format included for the docks that accept it.
+
+def speed(text):
+    # --speed: "max" (0, no pacing) or a positive factor
+    if text == "max": return 0.0
+    try:
+        value = float(text)
+    except ValueError:
+        value = math.nan
+    if not 0 < value < math.inf: raise argparse.ArgumentTypeError(f"invalid speed '{text}', a positive number or max")
+    return value
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recording to Vobot Mini Docks.")
+    parser.add_argument("recording")
+    parser.add_argument("-t", "--target", required=True, help="docks as \"ip[:port], ...\"")
+    parser.add_argument("-s", "--speed", type=speed, default=1.0, help="1 (recorded pace), N (N times faster) or max")
+    parser.add_argument("--loop", type=int, default=1, help="times the recording is played (default: %(default)s)")
+    parser.add_argument("--no-binary", action="store_true", help="do not offer the binary wire format")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every acked packet")
+    return parser.parse_args(argv)
+
+async def replay(engine, path, speed, loops):
+    # Returns (payloads pushed, seconds spent pushing them)
+    await engine.open()
+    pushed = 0
+    began = engine.loop.time()
+    elapsed = 0.0
+    try:
+        for _ in range(loops):
+            if not engine.running: break
+            start = engine.loop.time()
+            for timestamp, device_info in recording.read(path):
+                if not engine.running: break
+                if speed:
+                    delay = start + timestamp / speed - engine.loop.time()
+                    if delay > 0:
+                        try:
+                            await asyncio.wait_for(engine.stopped.wait(), delay)
+                        except asyncio.TimeoutError: pass
+                        if not engine.running: break
+                engine.push(device_info)
+                pushed += 1
+                if not speed and pushed % 64 == 0:
+                    # Let the acks in now and then
+                    await asyncio.sleep(0)
+        elapsed = engine.loop.time() - began
+        # Wait for the last acks
+        deadline = engine.loop.time() + engine.ack_timeout
+        while engine.running and any(target.pending for target in engine.targets) and engine.loop.time() < deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        engine.close()
+    return (pushed, elapsed)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        targets = udp_client.parse_targets(args.target)
+    except ValueError as e:
+        print(f"Invalid target [{e}].")
+        return 2
+    try:
+        for _ in recording.read(args.recording): break
+    except (OSError, ValueError) as e:
+        print(f"Cannot read the recording {args.recording} [{e}].")
+        return 2
+
+    engine = udp_client.Engine(None, targets, log=lambda line: print(line, flush=True), binary=not args.no_binary)
+    engine.log_success = args.verbose
+    signal.signal(signal.SIGINT, lambda signum, frame: engine.stop())
+
+    start = time.perf_counter()
+    pushed, pushing = asyncio.run(replay(engine, args.recording, args.speed, args.loop))
+    elapsed = time.perf_counter() - start
+    engine.report()
+    print(json.dumps({
+        "replay": args.recording,
+        "speed": args.speed or "max",
+        "payloads": pushed,
+        # Sending, then waiting up to ack_timeout for the last acks
+        "push_seconds": pushing,
+        "seconds": elapsed,
+        "payloads_per_s": pushed / pushing if pushing else 0.0,
+        "packets_sent": sum(target.sent for target in engine.targets),
+        "packets_acked": sum(target.acked for target in engine.targets),
+        "packets_lost": sum(target.timeouts for target in engine.targets),
+        "acks_pending": sum(len(target.pending) for target in engine.targets)
+    }))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
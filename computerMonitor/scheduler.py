@@ -0,0 +1,185 @@
+import time
+import queue
+import stats
+import threading
+from concurrent.futures import Future
+from collector import GROUPS, PLACEHOLDERS
+
+# Multi-rate collection: each payload group (see collector.GROUPS) is refreshed on its own
+# period and its last value is reused in between. Deadlines come from the monotonic clock
+# and advance by whole periods, so the schedule does not drift with the collection time.
+# Scheduler.collect() is the Engine's collect callable, the Engine ticks every
+# Scheduler.interval (the shortest period).
+#
+# The groups due in a tick are read concurrently, one worker thread per group, each within
+# its own time budget. A group that misses its budget (hung nvidia-smi, stalled network file
+# system, slow DNS) keeps its last value, listed in the payload's "Stale", and is not read
+# again before the late read returns, so a hung source never piles up threads.
+
+
+class Worker(threading.Thread):
+    # Runs the reads of one group. A daemon, unlike ThreadPoolExecutor workers, so a hung
+    # read does not keep the process from exiting.
+    def __init__(self, name):
+        super().__init__(name=f"collector-{name}", daemon=True)
+        self.jobs = queue.SimpleQueue()
+        self.start()
+
+    def submit(self, fn):
+        future = Future()
+        self.jobs.put((future, fn))
+        return future
+
+    def stop(self):
+        # The thread ends after the read in progress, if any
+        self.jobs.put(None)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None: return
+            future, fn = job
+            if not future.set_running_or_notify_cancel(): continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+class Group:
+    def __init__(self, name, read, period, budget, clock):
+        self.name = name
+        self.read = read
+        self.period = period
+        self.budget = budget # seconds a read may take before the tick goes on without it
+        self.clock = clock
+        self.due = None # next deadline, None before the first read
+        self.value = None
+        self.worker = None
+        self.future = None # read in progress
+        self.started = None
+        self.stale = False
+        self.reads = 0
+        self.errors = 0
+        self.timeouts = 0 # reads that missed their budget, and ticks skipped while one was running
+        self.overruns = 0 # deadlines missed entirely
+        self.jitter_total = 0.0 # |read start - deadline|
+        self.jitter_max = 0.0
+        self.read_total = 0.0
+        self.read_max = 0.0
+
+    def start(self, now):
+        if self.due is None:
+            self.due = now
+        else:
+            jitter = abs(now - self.due)
+            self.jitter_total += jitter
+            if jitter > self.jitter_max: self.jitter_max = jitter
+        self.due += self.period
+        if now >= self.due:
+            # Skip the deadlines that already passed, keeping the phase
+            missed = int((now - self.due) / self.period) + 1
+            self.overruns += missed
+            self.due += missed * self.period
+        self.started = now
+        if self.worker is None: self.worker = Worker(self.name)
+        self.future = self.worker.submit(self.read)
+        self.future.add_done_callback(self._done)
+
+    def _done(self, future):
+        # Worker thread, also for a read that already missed its budget
+        elapsed = self.clock() - self.started
+        self.reads += 1
+        self.read_total += elapsed
+        if elapsed > self.read_max: self.read_max = elapsed
+        try:
+            self.value = future.result()
+            self.stale = False
+        except Exception:
+            # Keep the previous value
+            self.errors += 1
+
+    def wait(self):
+        # Waits for the read started this tick until the budget runs out
+        try:
+            self.future.result(max(0.0, self.started + self.budget - self.clock()))
+        except Exception: pass
+        if not self.future.done():
+            self.timeouts += 1
+            self.stale = True
+
+    def summary(self):
+        reads = self.reads or 1
+        return "%s every %g s: %d reads, jitter avg %.1f ms max %.1f ms, read avg %.1f ms max %.1f ms, %d overruns, %d timeouts, %d errors" % (
+            self.name, self.period, self.reads, 1000 * self.jitter_total / reads, 1000 * self.jitter_max,
+            1000 * self.read_total / reads, 1000 * self.read_max, self.overruns, self.timeouts, self.errors)
+
+
+class Scheduler:
+    early = 0.01 # seconds, a tick woken up a hair before a deadline still refreshes the group
+
+    def __init__(self, periods, budgets=None, groups=GROUPS, clock=time.monotonic):
+        # periods / budgets: {group name: seconds}, budgets default to one second
+        budgets = budgets or {}
+        self.groups = [Group(name, read, periods[name], budgets.get(name, 1.0), clock) for name, read in groups]
+        self.interval = min(group.period for group in self.groups)
+        self.clock = clock
+
+    def collect(self):
+        # Payload with the groups that are due refreshed, the others from the cache
+        now = self.clock()
+        # Each group read calls its metric sources once: stats.reads_per_source() then
+        # shows one read per source of the groups refreshed in this tick
+        stats.begin_tick()
+        started = []
+        for group in self.groups:
+            if group.due is not None and now < group.due - self.early: continue
+            if group.future is not None and not group.future.done():
+                # Still stuck in a previous read
+                group.timeouts += 1
+                group.stale = True
+                continue
+            group.start(self.clock())
+            started.append(group)
+        for group in started:
+            group.wait()
+
+        device_info = {}
+        for group in self.groups:
+            device_info[group.name] = group.value if group.value is not None else PLACEHOLDERS[group.name]
+        stale = [group.name for group in self.groups if group.stale or group.value is None]
+        if stale: device_info["Stale"] = stale
+        return device_info
+
+    def summary(self):
+        lines = [group.summary() for group in self.groups]
+        # GPU backend found by the last probe, where the sensors backend measures it
+        timings = stats.Gpu.timings()
+        if timings.get("probe") is not None:
+            query = timings.get("query")
+            lines.append("GPU backend %s: probe %.1f ms, last query %s" % (
+                timings.get("backend", "?"), 1000 * timings["probe"], "-" if query is None else "%.1f ms" % (1000 * query)))
+        return "\n".join(lines)
+
+    def close(self):
+        # Stops the worker threads, a later collect() starts new ones
+        for group in self.groups:
+            if group.worker is not None:
+                group.worker.stop()
+                group.worker = None
+
+
+def _seconds(config, section, name, default):
+    try:
+        value = config.getfloat(section, name.lower(), fallback=default)
+    except ValueError:
+        print("Invalid %s for %s" % (section.lower(), name))
+        return default
+    return value if value > 0 else default
+
+def from_config(config, interval=5, intervals=None):
+    # Scheduler from the [Schedule] (period) and [Budget] (read time budget) sections,
+    # seconds per group: `intervals` {group name: seconds}, else `interval`, and one second by default
+    intervals = intervals or {}
+    periods = {name: _seconds(config, "Schedule", name, intervals.get(name, interval)) for name, _ in GROUPS}
+    budgets = {name: _seconds(config, "Budget", name, 1.0) for name, _ in GROUPS}
+    return Scheduler(periods, budgets)
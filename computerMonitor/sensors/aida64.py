@@ -0,0 +1,129 @@
+import sys
+import mmap
+import threading
+import xml.etree.ElementTree as xml_tree
+
+# AIDA64 exposes its sensor values as an XML fragment in a named shared memory block:
+# <sys><id>SCPUUTI</id><label>CPU Utilization</label><value>12</value></sys><temp>...</temp>
+# Only SharedMemorySource is Windows specific, decoding / parsing / indexing work on any
+# byte source so they can be exercised with recorded fixtures.
+
+def decode(b):
+    for encoding in (sys.getdefaultencoding(), "utf-8", "gbk"):
+        try:
+            return b.decode(encoding=encoding)
+        except UnicodeDecodeError: pass
+    return b.decode()
+
+def parse(data):
+    # Streaming parse of the raw bytes into a flat {(tag, label): value} index
+    index = {}
+    if not data: return index
+
+    parser = xml_tree.XMLPullParser(events=("end",))
+    parser.feed("<root>")
+    parser.feed(decode(data))
+    parser.feed("</root>")
+    label = None
+    value = None
+    for _, elem in parser.read_events():
+        if elem.tag == "label":
+            label = elem.text
+        elif elem.tag == "value":
+            value = elem.text
+        elif elem.tag not in ("id", "root"):
+            index[(elem.tag, label)] = value
+            label = None
+            value = None
+            elem.clear()
+    return index
+
+
+class SharedMemorySource:
+    # Reads the AIDA64 shared memory block, remembering the last buffer size that worked.
+    tagname = "AIDA64_SensorValues"
+    buffer_size_options = [100 * i for i in range(10, 120)]  # ranges in [1k, 12k]
+
+    def __init__(self):
+        self.length = None
+
+    def _read(self, length):
+        with mmap.mmap(-1, length, tagname=self.tagname, access=mmap.ACCESS_READ) as mm:
+            return mm.read()
+
+    def _try(self, length):
+        # Complete data when the buffer ends with the zero padding
+        data = self._read(length)
+        if data[-1] == 0: return data.rstrip(b"\x00")
+        return None
+
+    def __call__(self):
+        if self.length is not None:
+            try:
+                data = self._try(self.length)
+                if data is not None: return data
+            except PermissionError: pass
+            # The block was resized since the last read
+            self.length = None
+
+        # The size of the shared memory block is unknown.
+        # When the length is too long, a permissionError will be thrown.
+        # When the length is too short, the complete data cannot be obtained.
+        # Therefore, the binary search method is used to find the length that does not throw an exception.
+        low = 0
+        high = len(self.buffer_size_options) - 1
+        while low < high:
+            mid = (low + high) // 2
+            try:
+                length = self.buffer_size_options[mid]
+                data = self._try(length)
+                if data is not None:
+                    self.length = length
+                    return data
+                else:
+                    low = mid + 1
+            except PermissionError:
+                high = mid
+        return None
+
+
+class Aida64:
+    # Parses the AIDA64 data at most once per tick, getters read from the cached index.
+    # Thread-safe: the payload groups are read concurrently (see scheduler.py), and a late
+    # read of the previous tick may still run when the next tick invalidates the cache.
+    def __init__(self, source):
+        # source: callable returning the raw shared memory bytes (or None)
+        self.source = source
+        self.lock = threading.Lock()
+        # (index, tags) of this tick, published together once both are built:
+        # index is {(tag, label): value}, tags is {tag: [(label, value)]} in document order
+        self.cache = None
+        self.parses = 0
+
+    def invalidate(self):
+        # Called at the start of each tick
+        with self.lock:
+            self.cache = None
+
+    def snapshot(self):
+        cache = self.cache
+        if cache is None:
+            with self.lock:
+                cache = self.cache
+                if cache is None:
+                    try:
+                        index = parse(self.source())
+                    except Exception:
+                        index = {}
+                    self.parses += 1
+                    tags = {}
+                    for (tag, label), value in index.items():
+                        tags.setdefault(tag, []).append((label, value))
+                    cache = self.cache = (index, tags)
+        return cache
+
+    def value(self, tag, label, default=None):
+        return self.snapshot()[0].get((tag, label), default)
+
+    def items(self, tag):
+        return self.snapshot()[1].get(tag, [])
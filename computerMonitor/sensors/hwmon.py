@@ -0,0 +1,102 @@
+import os
+import re
+from sensors.procfs import ProcFile
+
+# CPU temperature straight from one resolved /sys/class/hwmon tempN_input file.
+# psutil.sensors_temperatures() walks and reads every hwmon / thermal file on each call,
+# here the files are found once and only those are reread on each tick.
+
+HWMON_ROOT = "/sys/class/hwmon"
+
+# Chip names in priority order: Intel, AMD, ARM, AMD with zenpower (k10temp is in blacklist)
+DEFAULT_CHIPS = ("coretemp", "k10temp", "cpu_thermal", "zenpower")
+
+# first: first sensor of the chip (same value as psutil's [0] entry)
+# package: package / die sensor of each socket, hottest socket wins
+# average / max: over all sensors of the chip(s)
+REDUCTIONS = ("first", "package", "average", "max")
+
+# Package sensor labels in priority order
+PACKAGE_LABELS = ("Package id", "Tdie", "Tctl")
+
+def _read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def _number(name):
+    match = re.search(r"\d+", name)
+    return int(match.group()) if match else 0
+
+def find_inputs(chips=DEFAULT_CHIPS, root=HWMON_ROOT):
+    # (chip, [(tempN_input path, label, hwmon dir)]) of the first chip in the priority list.
+    # Every hwmon entry with that name is included (one per socket on multi-socket servers).
+    try:
+        hwmons = sorted(os.listdir(root), key=_number)
+    except OSError:
+        hwmons = []
+    names = {hwmon: _read_text(os.path.join(root, hwmon, "name")) for hwmon in hwmons}
+
+    for chip in chips:
+        inputs = []
+        for hwmon in hwmons:
+            if names[hwmon] != chip: continue
+            directory = os.path.join(root, hwmon)
+            # Older kernels keep the attributes in the device directory
+            if not any(entry.endswith("_input") for entry in os.listdir(directory)):
+                directory = os.path.join(directory, "device")
+            for entry in sorted(os.listdir(directory), key=_number):
+                if not (entry.startswith("temp") and entry.endswith("_input")): continue
+                label = _read_text(os.path.join(directory, entry[:-len("input")] + "label"))
+                inputs.append((os.path.join(directory, entry), label, hwmon))
+        if inputs: return (chip, inputs)
+    raise LookupError("No CPU temperature sensor among %s" % ", ".join(chips))
+
+def select_inputs(inputs, reduction):
+    # The inputs read on each tick for this reduction
+    if reduction == "first": return inputs[:1]
+    if reduction == "package":
+        for prefix in PACKAGE_LABELS:
+            selected = [item for item in inputs if item[1].startswith(prefix)]
+            if selected: return selected
+        # No labelled package sensor: first sensor of each socket
+        first = {}
+        for item in inputs: first.setdefault(item[2], item)
+        return list(first.values())
+    if reduction == "average":
+        # Per-core sensors when the chip has them, the package would count twice
+        cores = [item for item in inputs if item[1].startswith("Core")]
+        return cores or inputs
+    if reduction == "max": return inputs
+    raise ValueError("Unknown temperature reduction '%s', expected one of %s" % (reduction, ", ".join(REDUCTIONS)))
+
+
+class HwmonTemperature:
+    def __init__(self, paths, reduction):
+        self.reduction = reduction
+        self.files = [ProcFile(path, 64) for path in paths]
+
+    @staticmethod
+    def resolve(chips=DEFAULT_CHIPS, reduction="first", root=HWMON_ROOT):
+        chip, inputs = find_inputs(chips, root)
+        return HwmonTemperature([item[0] for item in select_inputs(inputs, reduction)], reduction)
+
+    def read(self):
+        # °C
+        try:
+            values = []
+            for proc_file in self.files:
+                buffer, length = proc_file.read()
+                values.append(int(buffer[:length]) / 1000.0)
+        except Exception:
+            # Sensor went away (driver reload, hot-unplug): the caller resolves again
+            self.close()
+            raise
+        if self.reduction == "average": return sum(values) / len(values)
+        return max(values)
+
+    def close(self):
+        for proc_file in self.files:
+            proc_file.close()
@@ -0,0 +1,36 @@
+import importlib
+
+# Modules imported when one of their attributes is first used, so importing a backend does
+# not pay for libraries the machine never needs (e.g. GPUtil without an NVIDIA GPU).
+
+class LazyModule:
+    # Stands in for the module `name`. Optional modules test as False when they cannot be
+    # imported, like the former `try: import x except: x = None`.
+    def __init__(self, name, on_load=None):
+        self.__dict__.update(_name=name, _module=None, _error=None, _on_load=on_load)
+
+    def _load(self):
+        if self._module is None:
+            if self._error is not None: raise self._error
+            try:
+                module = importlib.import_module(self._name)
+            except Exception as e:
+                self.__dict__["_error"] = e
+                raise
+            self.__dict__["_module"] = module
+            if self._on_load is not None: self._on_load(module)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __bool__(self):
+        try:
+            self._load()
+            return True
+        except Exception:
+            return False
+
+def loaded(module):
+    # Whether a LazyModule was imported already, always True for a plain module
+    return not isinstance(module, LazyModule) or module.__dict__["_module"] is not None
@@ -0,0 +1,131 @@
+import os
+import math
+import time
+import atexit
+import shutil
+import platform
+import threading
+import subprocess
+from collections import namedtuple
+
+# Per-device GPU stats (also used for AMD devices), utilization in %, memory in MB, temperature in °C
+Device = namedtuple("Device", ("index", "name", "utilization", "memory_used", "memory_total", "temperature"))
+
+QUERY = "index,name,utilization.gpu,memory.used,memory.total,temperature.gpu"
+
+def _number(field):
+    # "[N/A]" / "[Not Supported]" are reported for sensors the device does not have
+    try:
+        return float(field)
+    except ValueError:
+        return math.nan
+
+def parse_line(line):
+    # One CSV line of "--format=csv,noheader,nounits" output, None when malformed
+    fields = [field.strip() for field in line.split(",")]
+    if len(fields) != 6: return None
+    try:
+        index = int(fields[0])
+    except ValueError:
+        return None
+    return Device(index, fields[1], _number(fields[2]), _number(fields[3]), _number(fields[4]), _number(fields[5]))
+
+def find_executable():
+    executable = shutil.which("nvidia-smi")
+    if executable is None and platform.system() == "Windows":
+        # Default install location of the NVIDIA driver tools
+        default = os.path.join(os.environ.get("ProgramFiles", "C:\\Program Files"),
+                               "NVIDIA Corporation", "NVSMI", "nvidia-smi.exe")
+        if os.path.exists(default): executable = default
+    return executable
+
+
+class LoopNotSupported(RuntimeError):
+    # nvidia-smi exited with an error before its first line, e.g. a version without -lms
+    pass
+
+
+class NvidiaSmiReader:
+    # Keeps one "nvidia-smi --query-gpu ... -lms" loop running and parses its output as it
+    # arrives, instead of spawning nvidia-smi (GPUtil.getGPUs()) for every read.
+    first_wait = 0.8 # seconds a read waits for the first lines, within the default 1 s GPU budget
+    startup = 10 # seconds nvidia-smi may take to print its first lines before it counts as stuck
+
+    def __init__(self, period_ms=1000):
+        self.period_ms = period_ms
+        self.process = None
+        self.thread = None
+        self.started = None # monotonic time of the last start
+        self.latest = {} # {index: Device}
+        self.updated = None # monotonic time of the last parsed line
+        self.lock = threading.Lock()
+
+    def start(self):
+        executable = find_executable()
+        if executable is None: raise FileNotFoundError("nvidia-smi not found")
+        self.process = subprocess.Popen(
+            [executable, "--query-gpu=" + QUERY, "--format=csv,noheader,nounits", "-lms", str(self.period_ms)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+            text=True, bufsize=1
+        )
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, args=(self.process,), daemon=True)
+        self.thread.start()
+
+    def _run(self, process):
+        for line in process.stdout:
+            device = parse_line(line)
+            if device is None: continue
+            with self.lock:
+                # Lines still buffered from a stopped loop are dropped
+                if process is not self.process: break
+                self.latest[device.index] = device
+                self.updated = time.monotonic()
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        with self.lock:
+            self.process = None
+            self.latest = {}
+            self.updated = None
+
+    def devices(self, timeout=None):
+        # Latest stats of every device. The first call starts the query loop and waits up
+        # to `timeout` seconds (default: first_wait) for the first lines. Raises TimeoutError
+        # while the loop is starting or when its output went stale (the loop is restarted on
+        # the next read), LoopNotSupported when nvidia-smi cannot run the loop.
+        if not self.running():
+            self.stop()
+            self.start()
+        if timeout is None: timeout = self.first_wait
+        deadline = time.monotonic() + timeout
+        while self.updated is None and self.running() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with self.lock:
+            now = time.monotonic()
+            if self.updated is not None and now - self.updated <= 3 * self.period_ms / 1000.0 + 1:
+                return [self.latest[index] for index in sorted(self.latest)]
+            process = self.process
+            first = self.updated is None
+        if first and process is not None:
+            code = process.poll()
+            if code is None and now - self.started < self.startup:
+                raise TimeoutError("nvidia-smi is starting")
+            if code not in (None, 0):
+                self.stop()
+                raise LoopNotSupported("nvidia-smi exited with code %d" % code)
+        # Stale output means the loop is stuck, restart it on the next read
+        self.stop()
+        raise TimeoutError("No output from nvidia-smi")
+
+NVIDIA_SMI = NvidiaSmiReader()
+atexit.register(NVIDIA_SMI.stop)
@@ -0,0 +1,118 @@
+import os
+import platform
+
+# Linux-native reader for the /proc files behind the CPU, memory and network metrics.
+# The files stay open and are reread from offset 0 into a reused buffer, and only the
+# fields needed by the payload are parsed. sensors_python falls back to psutil when
+# open_procfs() returns None or a read fails.
+
+class ProcFile:
+    # A /proc or /sys file kept open and reread with preadv() from offset 0
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        self.buffer = bytearray(size)
+
+    def read(self):
+        while True:
+            length = os.preadv(self.fd, [self.buffer], 0)
+            if length < len(self.buffer): return self.buffer, length
+            # The buffer was filled, the file may be longer: grow and read again
+            self.buffer = bytearray(len(self.buffer) * 2)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _field(buffer, length, name):
+    # Value of "Name:   1234 kB" in /proc/meminfo, in kB, None when missing
+    start = buffer.find(name, 0, length)
+    if start < 0: return None
+    start += len(name)
+    end = buffer.find(b"\n", start, length)
+    return int(buffer[start:end if end >= 0 else length].split()[0])
+
+
+class ProcFs:
+    def __init__(self):
+        self.stat = self.meminfo = self.net_dev = None
+        try:
+            self.stat = ProcFile("/proc/stat", 16384)
+            self.meminfo = ProcFile("/proc/meminfo", 8192)
+            self.net_dev = ProcFile("/proc/net/dev", 8192)
+        except:
+            # Do not leak the files already open
+            self.close()
+            raise
+
+    def cpu_times(self):
+        # [(busy, total)] per CPU in clock ticks, same accounting as CpuSampler._busy_total
+        buffer, length = self.stat.read()
+        # The cpu lines come first, skip the long intr / softirq lines
+        end = buffer.find(b"\nintr", 0, length)
+        times = []
+        for line in bytes(buffer[:end if end >= 0 else length]).split(b"\n"):
+            if not line.startswith(b"cpu"): break
+            if line.startswith(b"cpu "): continue
+            # cpuN user nice system idle iowait irq softirq steal guest guest_nice
+            fields = line.split()
+            # Guest time is already accounted in user / nice
+            total = sum(int(field) for field in fields[1:9])
+            idle = int(fields[4]) + (int(fields[5]) if len(fields) > 5 else 0)
+            times.append((total - idle, total))
+        return times
+
+    def memory(self):
+        # (total, free, used, percent, swap percent) with psutil's formulas, bytes and %
+        buffer, length = self.meminfo.read()
+        total = _field(buffer, length, b"MemTotal:") * 1024
+        free = _field(buffer, length, b"MemFree:") * 1024
+        buffers = (_field(buffer, length, b"Buffers:") or 0) * 1024
+        cached = ((_field(buffer, length, b"\nCached:") or 0) + (_field(buffer, length, b"SReclaimable:") or 0)) * 1024
+        available = _field(buffer, length, b"MemAvailable:")
+        available = available * 1024 if available is not None else free + buffers + cached
+
+        used = total - free - cached - buffers
+        if used < 0: used = total - free
+        percent = (total - available) / total * 100.0 if total else 0.0
+
+        swap_total = _field(buffer, length, b"SwapTotal:") or 0
+        swap_free = _field(buffer, length, b"SwapFree:") or 0
+        swap_percent = (swap_total - swap_free) / swap_total * 100.0 if swap_total else 0.0
+        return (total, free, used, percent, swap_percent)
+
+    def net_counters(self):
+        # {nic: (bytes_sent, bytes_recv)}
+        buffer, length = self.net_dev.read()
+        counters = {}
+        # Two header lines, then "  eth0: rx_bytes rx_packets ... (8 rx fields) tx_bytes ..."
+        for line in bytes(buffer[:length]).split(b"\n")[2:]:
+            name, sep, values = line.partition(b":")
+            if not sep: continue
+            fields = values.split()
+            counters[name.strip().decode()] = (int(fields[8]), int(fields[0]))
+        return counters
+
+    def close(self):
+        for proc_file in (self.stat, self.meminfo, self.net_dev):
+            if proc_file is not None: proc_file.close()
+
+
+def open_procfs():
+    # ProcFs when running on Linux with preadv(), otherwise None
+    if platform.system() != "Linux" or not hasattr(os, "preadv"): return None
+    try:
+        procfs = ProcFs()
+    except Exception:
+        return None
+    try:
+        # Fail now rather than on the first tick if the format is unexpected
+        procfs.cpu_times()
+        procfs.memory()
+        procfs.net_counters()
+        return procfs
+    except Exception:
+        procfs.close()
+        return None
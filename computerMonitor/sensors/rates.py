@@ -0,0 +1,42 @@
+import time
+
+
+class RateEngine:
+    # Per-second rates of cumulative counters (network bytes, disk I/O, context switches...).
+    # Every read is timestamped with the monotonic clock, so the rate uses the real
+    # interval between two reads instead of the nominal send period.
+    def __init__(self, smoothing=None):
+        # EWMA weight of the newest rate in (0, 1], None disables smoothing
+        self.smoothing = smoothing
+        self.samples = {} # {key: (timestamp, value)}
+        self.rates = {} # {key: rate per second}
+
+    def update(self, key, value, now=None):
+        if now is None: now = time.monotonic()
+        previous = self.samples.get(key)
+        self.samples[key] = (now, value)
+
+        # First read of this counter: no interval yet, nothing was observed
+        if previous is None: return 0.0
+
+        elapsed = now - previous[0]
+        delta = value - previous[1]
+        # Counter was reset / wrapped or read twice at once: keep the last rate
+        if elapsed <= 0 or delta < 0: return self.rates.get(key, 0.0)
+
+        rate = delta / elapsed
+        if self.smoothing and key in self.rates:
+            rate = self.smoothing * rate + (1.0 - self.smoothing) * self.rates[key]
+        self.rates[key] = rate
+        return rate
+
+    def update_all(self, counters, now=None):
+        # {key: cumulative value} -> {key: rate}, all read at the same instant
+        if now is None: now = time.monotonic()
+        return {key: self.update(key, value, now) for key, value in counters.items()}
+
+    def retain(self, keys):
+        # Forget counters that disappeared (e.g. unplugged network interfaces)
+        for key in [key for key in self.samples if key not in keys]:
+            del self.samples[key]
+            self.rates.pop(key, None)
@@ -1,31 +1,116 @@
 import math
-import GPUtil
-import psutil
+import time
 import platform
 from enum import IntEnum, auto
-try:
-    import pyamdgpuinfo
-except:
-    pyamdgpuinfo = None
-
-try:
-    import pyadl
-except:
-    pyadl = None
+from sensors.lazy import LazyModule
+from sensors.rates import RateEngine
+from sensors.nvidia import NVIDIA_SMI, Device, LoopNotSupported
+from sensors.procfs import open_procfs
+from sensors.hwmon import HwmonTemperature, DEFAULT_CHIPS, REDUCTIONS
+
+# Imported on first use: the /proc fast path does not need psutil for most metrics, and the
+# GPU libraries are only needed once a GPU probe gets to them (GPUtil alone costs ~0.3 s)
+psutil = LazyModule("psutil")
+GPUtil = LazyModule("GPUtil")
+pyamdgpuinfo = LazyModule("pyamdgpuinfo")
+pyadl = LazyModule("pyadl")
 
 class GpuType(IntEnum):
     UNSUPPORTED = auto()
     AMD = auto()
     NVIDIA = auto()
 
-pnic_before = {}
 DETECTED_GPU = GpuType.UNSUPPORTED
+# Linux /proc fast path for CPU, memory and network, None to always use psutil
+PROCFS = open_procfs()
+# CPU temperature chips in priority order and how their sensors are reduced, see sensors.hwmon
+CPU_TEMPERATURE_CHIPS = DEFAULT_CHIPS
+CPU_TEMPERATURE_REDUCTION = "first"
+
+
+class CpuSampler:
+    # CPU utilisation from the counters of the previous call, so sampling never sleeps.
+    def __init__(self):
+        self.previous = None
+        self.overall = 0.0
+        self.per_core = []
+
+    @staticmethod
+    def _busy_total(times):
+        total = sum(times)
+        # Guest time is already accounted in user / nice on Linux
+        total -= getattr(times, "guest", 0) + getattr(times, "guest_nice", 0)
+        idle = times.idle + getattr(times, "iowait", 0)
+        return (total - idle, total)
+
+    @staticmethod
+    def _percent(before, after):
+        busy = after[0] - before[0]
+        total = after[1] - before[1]
+        if total <= 0: return None
+        return min(100.0, max(0.0, busy / total * 100.0))
+
+    @staticmethod
+    def _read():
+        if PROCFS is not None:
+            try:
+                return (PROCFS.cpu_times(), "procfs")
+            except Exception: pass
+        return ([CpuSampler._busy_total(times) for times in psutil.cpu_times(percpu=True)], "psutil")
+
+    def update(self):
+        # Only per-CPU times are read, the overall counters are their sum
+        current, source = CpuSampler._read()
+        overall = (sum(item[0] for item in current), sum(item[1] for item in current))
+        # The first call reports the utilisation since boot
+        previous = self.previous or ([(0.0, 0.0)] * len(current), (0.0, 0.0), source)
+        if len(previous[0]) != len(current) or previous[2] != source:
+            # CPUs went online / offline: restart from the boot counters
+            # (or the counters come from another source, in other units)
+            previous = ([(0.0, 0.0)] * len(current), (0.0, 0.0), source)
+
+        percent = CpuSampler._percent(previous[1], overall)
+        if percent is not None: self.overall = percent
+        per_core = []
+        for i, core in enumerate(current):
+            percent = CpuSampler._percent(previous[0][i], core)
+            if percent is None:
+                percent = self.per_core[i] if i < len(self.per_core) else 0.0
+            per_core.append(percent)
+        self.per_core = per_core
+        self.previous = (current, overall, source)
+        return self.overall
+
+CPU_SAMPLER = CpuSampler()
 
 
 class Cpu:
     @staticmethod
-    def percentage(interval):
-        return (int(psutil.cpu_percent(interval=interval)), "%")
+    def percentage(interval=None):
+        if interval:
+            # Blocking sample over the interval
+            return (int(psutil.cpu_percent(interval=interval)), "%")
+        return (int(CPU_SAMPLER.update()), "%")
+
+    @staticmethod
+    def per_core():
+        # Per-core utilisation of the last percentage() call
+        return [(int(percent), "%") for percent in CPU_SAMPLER.per_core]
+
+    @staticmethod
+    def discover_temperature():
+        # Resolve the temperature source once, see stats.Registry.
+        # Preferably the hwmon files themselves, each tick then reads only those.
+        try:
+            source = HwmonTemperature.resolve(CPU_TEMPERATURE_CHIPS, CPU_TEMPERATURE_REDUCTION)
+            return lambda: (int(source.read()), "°C")
+        except Exception: pass
+
+        sensors_temps = psutil.sensors_temperatures()
+        for chip in CPU_TEMPERATURE_CHIPS:
+            if sensors_temps.get(chip):
+                return lambda: (int(psutil.sensors_temperatures()[chip][0].current), "°C")
+        raise LookupError("No supported CPU temperature sensor")
 
     @staticmethod
     def temperature():
@@ -46,111 +131,196 @@ class Cpu:
         return (int(cpu_temp), "°C")
 
 
-class Gpu:
-    @staticmethod
-    def stats():
+def gpu_summary(devices):
+    # (VRAM used %, temperature) of the device using the most VRAM, or of the hottest one
+    # when no VRAM is reported. The payload's GPU "usage" is VRAM use for every vendor;
+    # per-device utilisation is in Gpu.devices() (OpenMetrics endpoint).
+    def key(device):
+        percent = device.memory_used / device.memory_total * 100 if device.memory_total else math.nan
+        return (-1 if math.isnan(percent) else percent, -1 if math.isnan(device.temperature) else device.temperature, percent)
+    if not devices: return (math.nan, math.nan)
+    busiest = max(devices, key=key)
+    return (key(busiest)[2], busiest.temperature)
+
+
+class GpuManager:
+    # Probes NVIDIA, pyamdgpuinfo and pyadl once and keeps the device handles.
+    # After a failed probe or query, probing is retried with an exponential backoff.
+    min_backoff = 5 # seconds
+    max_backoff = 300
+
+    def __init__(self):
+        self.handles = []
+        self.probed = False
+        self.next_probe = 0.0
+        self.backoff = self.min_backoff
+        self.devices = [] # Device of every GPU at the last query
+        self.timings = {"probe": None, "query": None} # seconds spent in the last probe / query
+
+    def _failed(self):
+        global DETECTED_GPU
+        DETECTED_GPU = GpuType.UNSUPPORTED
+        self.handles = []
+        self.devices = []
+        self.next_probe = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+
+    def probe(self):
         global DETECTED_GPU
-        if DETECTED_GPU == GpuType.AMD and GpuAmd.is_available():
-            stats = GpuAmd.stats()
-        elif DETECTED_GPU == GpuType.NVIDIA and GpuNvidia.is_available():
-            stats = GpuNvidia.stats()
+        start = time.perf_counter()
+        detected = GpuType.UNSUPPORTED
+        if GpuNvidia.is_available():
+            detected = GpuType.NVIDIA
         else:
-            stats = ("-", "-")
-        return ((int(stats[0]), "%"), (int(stats[1]), "°C"))
+            try:
+                self.handles = GpuAmd.handles()
+                if self.handles: detected = GpuType.AMD
+            except: pass
+        self.timings["probe"] = time.perf_counter() - start
+        self.probed = True
 
+        DETECTED_GPU = detected
+        if detected == GpuType.UNSUPPORTED:
+            self._failed()
+        else:
+            self.backoff = self.min_backoff
+        return detected
 
-class GpuNvidia:
-    @staticmethod
-    def stats():
-        # Unlike other sensors, Nvidia GPU with GPUtil pulls in all the stats at once
-        nvidia_gpus = GPUtil.getGPUs()
+    def stats(self):
+        if DETECTED_GPU == GpuType.UNSUPPORTED:
+            if self.probed and time.monotonic() < self.next_probe:
+                raise LookupError("No supported GPU found")
+            if self.probe() == GpuType.UNSUPPORTED:
+                raise LookupError("No supported GPU found")
 
+        start = time.perf_counter()
         try:
-            memory_used_all = [item.memoryUsed for item in nvidia_gpus]
-            memory_used_mb = sum(memory_used_all) / len(memory_used_all)
+            if DETECTED_GPU == GpuType.NVIDIA:
+                self.devices = GpuNvidia.devices()
+            else:
+                self.devices = GpuAmd.devices(self.handles)
+        except TimeoutError:
+            # nvidia-smi starting or stuck: no value this read, the backend is kept
+            raise
         except:
-            memory_used_mb = math.nan
+            # Drop the handles, the next probe finds the devices again
+            self._failed()
+            raise
+        self.timings["query"] = time.perf_counter() - start
+        return gpu_summary(self.devices)
 
-        try:
-            memory_total_all = [item.memoryTotal for item in nvidia_gpus]
-            memory_total_mb = sum(memory_total_all) / len(memory_total_all)
-            memory_percentage = (memory_used_mb / memory_total_mb) * 100
-        except:
-            memory_percentage = math.nan
+GPU_MANAGER = GpuManager()
 
 
-        try:
-            temperature_all = [item.temperature for item in nvidia_gpus]
-            temperature = sum(temperature_all) / len(temperature_all)
-        except:
-            temperature = math.nan
+class Gpu:
+    @staticmethod
+    def stats():
+        stats = GPU_MANAGER.stats()
+        return ((int(stats[0]), "%"), (int(stats[1]), "°C"))
 
-        return (memory_percentage, temperature)
+    @staticmethod
+    def devices():
+        # Per-device stats of the last stats() read, nothing is queried here
+        return list(GPU_MANAGER.devices)
+
+    @staticmethod
+    def timings():
+        return dict(GPU_MANAGER.timings, backend=DETECTED_GPU.name)
+
+
+class GpuNvidia:
+    @staticmethod
+    def devices():
+        # Per-device stats from the long-running nvidia-smi query loop. Timeouts are raised:
+        # spawning nvidia-smi again for each read is what the loop avoids.
+        try:
+            return NVIDIA_SMI.devices()
+        except FileNotFoundError:
+            # No nvidia-smi, GPUtil would not find a GPU either
+            return []
+        except LoopNotSupported:
+            # nvidia-smi without loop support: fall back to one GPUtil query
+            return [Device(gpu.id, gpu.name, gpu.load * 100.0, gpu.memoryUsed, gpu.memoryTotal, gpu.temperature)
+                    for gpu in GPUtil.getGPUs()]
 
     @staticmethod
     def is_available():
         try:
-            return len(GPUtil.getGPUs()) > 0
+            return len(GpuNvidia.devices()) > 0
+        except TimeoutError:
+            # nvidia-smi runs but has not printed its first lines yet
+            return NVIDIA_SMI.running()
         except:
             return False
 
 
 class GpuAmd:
     @staticmethod
-    def stats():
+    def handles():
+        # Device handles, looked up once by the GPU manager
         if pyamdgpuinfo:
-            # Unlike other sensors, AMD GPU with pyamdgpuinfo pulls in all the stats at once
-            i = 0
-            amd_gpus = []
-            while i < pyamdgpuinfo.detect_gpus():
-                amd_gpus.append(pyamdgpuinfo.get_gpu(i))
-                i = i + 1
-
-            try:
-                memory_used_all = [item.query_vram_usage() for item in amd_gpus]
-                memory_used_bytes = sum(memory_used_all) / len(memory_used_all)
-            except:
-                memory_used_bytes = math.nan
-
-            try:
-                memory_total_all = [item.memory_info["vram_size"] for item in amd_gpus]
-                memory_total_bytes = sum(memory_total_all) / len(memory_total_all)
-                memory_percentage = (memory_used_bytes / memory_total_bytes) * 100
-            except:
-                memory_percentage = math.nan
-
-            try:
-                temperature_all = [item.query_temperature() for item in amd_gpus]
-                temperature = sum(temperature_all) / len(temperature_all)
-            except:
-                temperature = math.nan
-
-            return (memory_percentage, temperature)
+            return [pyamdgpuinfo.get_gpu(i) for i in range(pyamdgpuinfo.detect_gpus())]
         elif pyadl:
-            amd_gpus = pyadl.ADLManager.getInstance().getDevices()
+            return list(pyadl.ADLManager.getInstance().getDevices())
+        return []
 
-            try:
-                temperature_all = [item.getCurrentTemperature() for item in amd_gpus]
-                temperature = sum(temperature_all) / len(temperature_all)
-            except:
-                temperature = math.nan
+    @staticmethod
+    def _query(fn, scale=1.0):
+        try:
+            return fn() * scale
+        except:
+            return math.nan
 
-            return (math.nan, temperature)
+    @staticmethod
+    def devices(amd_gpus=None):
+        # Per-device stats, memory in MB. pyadl only reports the load and the temperature.
+        if amd_gpus is None: amd_gpus = GpuAmd.handles()
+        devices = []
+        for i, item in enumerate(amd_gpus):
+            if pyamdgpuinfo:
+                devices.append(Device(i, str(getattr(item, "name", "AMD GPU")),
+                                      GpuAmd._query(item.query_load, 100.0),
+                                      GpuAmd._query(item.query_vram_usage, 1 / 1024.0 ** 2),
+                                      GpuAmd._query(lambda: item.memory_info["vram_size"], 1 / 1024.0 ** 2),
+                                      GpuAmd._query(item.query_temperature)))
+            else:
+                devices.append(Device(i, str(getattr(item, "adapterName", "AMD GPU")),
+                                      GpuAmd._query(item.getCurrentUsage), math.nan, math.nan,
+                                      GpuAmd._query(item.getCurrentTemperature)))
+        return devices
 
     @staticmethod
     def is_available():
         try:
-            if pyamdgpuinfo and pyamdgpuinfo.detect_gpus() > 0:
-                return True
-            elif pyadl and len(pyadl.ADLManager.getInstance().getDevices()) > 0:
-                return True
-            else:
-                return False
+            return len(GpuAmd.handles()) > 0
         except:
             return False
 
 
 class Memory:
+    @staticmethod
+    def stats():
+        if PROCFS is not None:
+            try:
+                total, free, used, percent, swap_percent = PROCFS.memory()
+                return (
+                    (int(swap_percent), "%"),
+                    (int(used / (1024.0 ** 2)), "MB"),
+                    (int(free / (1024.0 ** 2)), "MB"),
+                    (int(percent), "%")
+                )
+            except Exception: pass
+
+        # Read each psutil source once for all memory fields
+        virtual = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return (
+            (int(swap.percent), "%"),
+            (int(virtual.used / (1024.0 ** 2)), "MB"),
+            (int(virtual.free / (1024.0 ** 2)), "MB"),
+            (int(virtual.percent), "%")
+        )
+
     @staticmethod
     def swap_percent():
         return (int(psutil.swap_memory().percent), "%")
@@ -169,65 +339,110 @@ class Memory:
 
 
 class Disk:
+    # macOS keeps user data on a separate APFS volume, resolved on first use.
+    path = None
+
+    @staticmethod
+    def _usage():
+        if Disk.path is None:
+            Disk.path = "/"
+            if platform.system() == "Darwin":
+                try:
+                    psutil.disk_usage("/System/Volumes/Data")
+                    Disk.path = "/System/Volumes/Data"
+                except: pass
+        return psutil.disk_usage(Disk.path)
+
+    @staticmethod
+    def stats():
+        # One disk_usage() call for all disk fields
+        usage = Disk._usage()
+        return (
+            (int(usage.used / (1024.0 ** 3)), "GB"),
+            (int(usage.free / (1024.0 ** 3)), "GB"),
+            (int(usage.total / (1024.0 ** 3)), "GB"),
+            (int(usage.percent), "%")
+        )
+
     @staticmethod
     def disk_usage_percent():
-        if platform.system() == "Darwin":
-            try:
-                return (int(psutil.disk_usage("/System/Volumes/Data").percent), "%")
-            except: pass
-        return (int(psutil.disk_usage("/").percent), "%")
+        return (int(Disk._usage().percent), "%")
 
     @staticmethod
     def disk_used():
-        if platform.system() == "Darwin":
-            try:
-                return (int(psutil.disk_usage("/System/Volumes/Data").used / (1024.0 ** 3)), "GB")
-            except: pass
-        return (int(psutil.disk_usage("/").used / (1024.0 ** 3)), "GB")
+        return (int(Disk._usage().used / (1024.0 ** 3)), "GB")
 
     @staticmethod
     def disk_free():
-        if platform.system() == "Darwin":
-            try:
-                return (int(psutil.disk_usage("/System/Volumes/Data").free / (1024.0 ** 3)), "GB")
-            except: pass
-        return (int(psutil.disk_usage("/").free / (1024.0 ** 3)), "GB")
+        return (int(Disk._usage().free / (1024.0 ** 3)), "GB")
 
     @staticmethod
     def disk_total():
-        if platform.system() == "Darwin":
-            try:
-                return (int(psutil.disk_usage("/System/Volumes/Data").total / (1024.0 ** 3)), "GB")
-            except: pass
-        return (int(psutil.disk_usage("/").total / (1024.0 ** 3)), "GB")
+        return (int(Disk._usage().total / (1024.0 ** 3)), "GB")
+
+
+# Rates of the per-NIC byte counters, set smoothing (0, 1] to enable EWMA
+NET_RATES = RateEngine()
 
 
 class Net:
     @staticmethod
-    def stats(interval):
-        global pnic_before
-
-        result = {}
-        dl_rate = None
-        # Get current counters
-        pnic_after = psutil.net_io_counters(pernic=True)
+    def stats(interval=None):
+        # The interval is measured between reads, the argument is kept for compatibility
+        pnic = None
+        if PROCFS is not None:
+            try:
+                pnic = PROCFS.net_counters()
+            except Exception: pass
+        if pnic is None:
+            pnic = {if_name: (if_info.bytes_sent, if_info.bytes_recv)
+                    for if_name, if_info in psutil.net_io_counters(pernic=True).items()}
+
+        counters = {}
+        for if_name, (bytes_sent, bytes_recv) in pnic.items():
+            counters[(if_name, "sent")] = bytes_sent
+            counters[(if_name, "recv")] = bytes_recv
+        rates = NET_RATES.update_all(counters)
+        NET_RATES.retain(counters)
 
         # Select the NIC with the highest download rate.
-        for if_name, if_info in pnic_after.items():
-            try:
-                upload_rate = (if_info.bytes_sent - pnic_before[if_name].bytes_sent) / interval
-                uploaded = if_info.bytes_sent
-                download_rate = (if_info.bytes_recv - pnic_before[if_name].bytes_recv) / interval
-                downloaded = if_info.bytes_recv
-                if dl_rate is None or (download_rate > dl_rate):
-                    result = {
-                        "up_rate": (round(upload_rate / 1024.0, 1), "KB/s"), # Upload rate
-                        "dl_rate": (round(download_rate / 1024.0, 1), "KB/s"), # Download rate
-                        "uploaded": (round(uploaded / (1024.0 ** 2), 1), "MB"), # Amount of data uploaded
-                        "downloaded": (round(downloaded / (1024.0 ** 2), 1), "MB") # Amount of data downloaded
-                    }
-                    dl_rate = download_rate
-            # Interface might not be in pnic_before for now
-            except: pass
-            pnic_before.update({if_name: pnic_after[if_name]})
-        return result
+        # On the first read all rates are 0, the busiest NIC so far is used.
+        selected = None
+        for if_name, (bytes_sent, bytes_recv) in pnic.items():
+            key = (rates[(if_name, "recv")], bytes_recv)
+            if selected is None or key > selected[0]:
+                selected = (key, if_name, bytes_sent, bytes_recv)
+        if selected is None: return {}
+
+        _, if_name, bytes_sent, bytes_recv = selected
+        return {
+            "up_rate": (round(rates[(if_name, "sent")] / 1024.0, 1), "KB/s"), # Upload rate
+            "dl_rate": (round(rates[(if_name, "recv")] / 1024.0, 1), "KB/s"), # Download rate
+            "uploaded": (round(bytes_sent / (1024.0 ** 2), 1), "MB"), # Amount of data uploaded
+            "downloaded": (round(bytes_recv / (1024.0 ** 2), 1), "MB") # Amount of data downloaded
+        }
+
+
+def configure(options):
+    # Options of the [Sensors] section in configuration.ini
+    global CPU_TEMPERATURE_CHIPS, CPU_TEMPERATURE_REDUCTION
+    if options.get("temperature_chips"):
+        CPU_TEMPERATURE_CHIPS = tuple(chip.strip() for chip in options["temperature_chips"].split(",") if chip.strip())
+
+    reduction = options.get("temperature_reduction", "").strip()
+    if reduction in REDUCTIONS:
+        CPU_TEMPERATURE_REDUCTION = reduction
+    elif reduction:
+        print("Unknown temperature_reduction '%s', expected one of %s" % (reduction, ", ".join(REDUCTIONS)))
+
+    try:
+        smoothing = float(options.get("network_smoothing", 0))
+        NET_RATES.smoothing = smoothing if 0 < smoothing <= 1 else None
+    except ValueError:
+        print("Invalid network_smoothing '%s', expected a number in (0, 1]" % options["network_smoothing"])
+
+
+# Metrics whose source is resolved once by stats.Registry
+DISCOVERERS = {
+    "cpu_temperature": Cpu.discover_temperature
+}
@@ -1,56 +1,20 @@
-import sys
 import math
-import mmap
 import psutil
+import threading
 from win32api import *
-import xml.etree.ElementTree as xml_tree
+from sensors.aida64 import Aida64, SharedMemorySource
 import clr  # Clr is from pythonnet package. Do not install clr package
 
-def _read_data_with_aida64(length):
-    with mmap.mmap(-1, length, tagname="AIDA64_SensorValues", access=mmap.ACCESS_READ) as mm:
-        return mm.read()
+# AIDA64 shared memory is parsed at most once per tick, see begin_tick()
+AIDA64 = Aida64(SharedMemorySource())
+
+def begin_tick():
+    AIDA64.invalidate()
 
-def _decode(b):
-    for encoding in (sys.getdefaultencoding(), "utf-8", "gbk"):
-        try:
-            return b.decode(encoding=encoding)
-        except UnicodeDecodeError: pass
-    return b.decode()
-
-def _get_xml_data():
-    # The size of the shared memory block is unknown.
-    # When the length is too long, a permissionError will be thrown.
-    # When the length is too short, the complete data cannot be obtained.
-    # Therefore, the binary search method is used to find the length that does not throw an exception.
-    buffer_size_options = [100 * i for i in range(10, 120)]  # ranges in [1k, 12k]
-    low = 0
-    high = len(buffer_size_options) - 1
-
-    while low < high:
-        mid = (low + high) // 2
-        try:
-            length = buffer_size_options[mid]
-            data = _read_data_with_aida64(length)
-            if data[-1] == 0:
-                decoded = _decode(data.rstrip(b"\x00"))
-                return f"<root>{decoded}</root>"
-            else:
-                low = mid
-        except PermissionError:
-            high = mid
-
-def _get_data():
-    data = {}
-    data_tree = xml_tree.fromstring(_get_xml_data())
-
-    for item in data_tree:
-        if item.tag not in data: data[item.tag] = {}
-        data[item.tag][item.find("label").text] = {
-            "id": item.find("id").text,
-            "value": item.find("value").text
-        }
-    return data
 
+# The payload groups are read concurrently (see scheduler.py), LibreHardwareMonitor
+# hardware updates are serialised
+LHM_LOCK = threading.Lock()
 
 ####################################################
 # Import LibreHardwareMonitor dll to Python
@@ -101,14 +65,14 @@ def get_hw_and_update(hwtype, name = None):
     for hardware in handle.Hardware:
         if hardware.HardwareType == hwtype:
             if (name and hardware.Name == name) or not name:
-                hardware.Update()
+                with LHM_LOCK: hardware.Update()
                 return hardware
     return None
 
 def get_net_interface_and_update(if_name):
     for hardware in handle.Hardware:
         if hardware.HardwareType == Hardware.HardwareType.Network and hardware.Name == if_name:
-            hardware.Update()
+            with LHM_LOCK: hardware.Update()
             return hardware
 
     print("Network interface '%s' not found. Check names in config.yaml." % if_name)
@@ -177,12 +141,31 @@ def get_gpu_name():
         return gpu_to_use
 gpu_name = get_gpu_name()
 
+def _aida64_accessor(tag, label, unit):
+    # Raises when AIDA64 does not provide a numeric value for this label
+    float(AIDA64.value(tag, label))
+    return lambda: (int(float(AIDA64.value(tag, label))), unit)
+
+def _lhm_accessor(hwtype, sensor_type, prefixes, unit):
+    # Resolve the hardware and the first sensor matching the prefixes, in priority order.
+    # Each read then only updates that hardware instead of scanning all sensors.
+    hardware = get_hw_and_update(hwtype)
+    if hardware is None: raise LookupError(f"No {hwtype} hardware")
+    for prefix in prefixes:
+        for sensor in hardware.Sensors:
+            if sensor.SensorType == sensor_type and str(sensor.Name).startswith(prefix):
+                def read(hardware=hardware, sensor=sensor):
+                    with LHM_LOCK: hardware.Update()
+                    return (int(float(sensor.Value)), unit)
+                return read
+    raise LookupError(f"No {hwtype} sensor starting with {prefixes}")
+
 ####################################################
 class Cpu:
     @staticmethod
     def percentage(interval):
         # Attempting to retrieve data from AIDA64
-        percent = _get_data().get("sys", {}).get("CPU Utilization", {}).get("value", math.nan)
+        percent = AIDA64.value("sys", "CPU Utilization", math.nan)
 
         if percent is math.nan:
             cpu = get_hw_and_update(Hardware.HardwareType.Cpu)
@@ -191,11 +174,19 @@ class Cpu:
                     percent = float(sensor.Value)
         return (int(percent), "%")
 
+    @staticmethod
+    def per_core():
+        cpu = get_hw_and_update(Hardware.HardwareType.Cpu)
+        cores = []
+        for sensor in cpu.Sensors:
+            if sensor.SensorType == Hardware.SensorType.Load and str(sensor.Name).startswith("CPU Core #"):
+                cores.append((int(sensor.Value), "%"))
+        return cores
 
     @staticmethod
     def temperature():
         # Attempting to retrieve data from AIDA64
-        temp = _get_data().get("temp", {}).get("CPU Package", {}).get("value", math.nan)
+        temp = AIDA64.value("temp", "CPU Package", math.nan)
 
         if temp is math.nan:
             cpu = get_hw_and_update(Hardware.HardwareType.Cpu)
@@ -224,6 +215,22 @@ class Cpu:
 
         return (int(temp), "°")
 
+    @staticmethod
+    def discover_percentage():
+        try:
+            return _aida64_accessor("sys", "CPU Utilization", "%")
+        except Exception:
+            return _lhm_accessor(Hardware.HardwareType.Cpu, Hardware.SensorType.Load, ("CPU Total",), "%")
+
+    @staticmethod
+    def discover_temperature():
+        try:
+            return _aida64_accessor("temp", "CPU Package", "°")
+        except Exception:
+            # Same priority as temperature(): core average, core max, package, any core
+            return _lhm_accessor(Hardware.HardwareType.Cpu, Hardware.SensorType.Temperature,
+                                 ("Core Average", "Core Max", "CPU Package", "Core"), "°")
+
 class Gpu:
     @staticmethod
     def get_stats_LHM():
@@ -257,21 +264,20 @@ class Gpu:
     @staticmethod
     def stats():
         # Attempting to retrieve data from AIDA64
-        data = _get_data()
         gpu_info = {}
-        for label, info in data.get("temp", {}).items():
+        for label, value in AIDA64.items("temp"):
             if not label.startswith("GPU"): continue
             title = label.split(" ")[0]
             if label == title + " Diode":
                 if title not in gpu_info:
                     gpu_info[title] = {}
-                gpu_info[title]["diode"] = info.get("value", math.nan)
-                gpu_info[title]["utilization"] = data.get("sys", {}).get(title + " Utilization", {}).get("value", math.nan)
+                gpu_info[title]["diode"] = value
+                gpu_info[title]["utilization"] = AIDA64.value("sys", title + " Utilization", math.nan)
             elif label == title + " Hotspot":
                 if title not in gpu_info:
                     gpu_info[title] = {}
-                gpu_info[title]["hotspot"] = info.get("value", math.nan)
-                gpu_info[title]["utilization"] = data.get("sys", {}).get(title + " Utilization", {}).get("value", math.nan)
+                gpu_info[title]["hotspot"] = value
+                gpu_info[title]["utilization"] = AIDA64.value("sys", title + " Utilization", math.nan)
 
         gpu_temp = math.nan
         gpu_usage = math.nan
@@ -307,15 +313,38 @@ class Gpu:
 
 
 class Memory:
+    @staticmethod
+    def stats():
+        try:
+            swap_percent = Memory.swap_percent()
+        except:
+            swap_percent = ("-", "%")
+
+        try:
+            virtual_used = Memory.virtual_used()
+        except:
+            virtual_used = ("-", "MB")
+
+        try:
+            virtual_free = Memory.virtual_free()
+        except:
+            virtual_free = ("-", "MB")
+
+        try:
+            virtual_percent = Memory.virtual_percent()
+        except:
+            virtual_percent = ("-", "%")
+
+        return (swap_percent, virtual_used, virtual_free, virtual_percent)
+
     @staticmethod
     def swap_percent():
         # Compute swap stats from virtual / physical memory stats
         # Attempting to retrieve data from AIDA64
-        data = _get_data()
-        mem_used = float(data.get("sys", {}).get("Used Memory", {}).get("value", math.nan))
-        mem_available = float(data.get("sys", {}).get("Free Memory", {}).get("value", math.nan))
-        virtual_mem_used = float(data.get("sys", {}).get("Used Virtual Memory", {}).get("value", math.nan))
-        virtual_mem_available = float(data.get("sys", {}).get("Free Virtual Memory", {}).get("value", math.nan))
+        mem_used = float(AIDA64.value("sys", "Used Memory", math.nan))
+        mem_available = float(AIDA64.value("sys", "Free Memory", math.nan))
+        virtual_mem_used = float(AIDA64.value("sys", "Used Virtual Memory", math.nan))
+        virtual_mem_available = float(AIDA64.value("sys", "Free Virtual Memory", math.nan))
 
         if mem_used is math.nan or mem_available is math.nan or virtual_mem_used is math.nan or virtual_mem_available is math.nan:
             memory = get_hw_and_update(Hardware.HardwareType.Memory)
@@ -338,7 +367,7 @@ class Memory:
     @staticmethod
     def virtual_percent():
         # Attempting to retrieve data from AIDA64
-        precent = _get_data().get("sys", {}).get("Memory Utilization", {}).get("value", math.nan)
+        precent = AIDA64.value("sys", "Memory Utilization", math.nan)
 
         if precent is math.nan:
             memory = get_hw_and_update(Hardware.HardwareType.Memory)
@@ -351,7 +380,7 @@ class Memory:
     @staticmethod
     def virtual_used():
         # Attempting to retrieve data from AIDA64
-        used = _get_data().get("sys", {}).get("Used Memory", {}).get("value", math.nan)
+        used = AIDA64.value("sys", "Used Memory", math.nan)
 
         if used is math.nan:
             memory = get_hw_and_update(Hardware.HardwareType.Memory)
@@ -364,7 +393,7 @@ class Memory:
     @staticmethod
     def virtual_free():
         # Attempting to retrieve data from AIDA64
-        free = _get_data().get("sys", {}).get("Free Memory", {}).get("value", math.nan)
+        free = AIDA64.value("sys", "Free Memory", math.nan)
 
         if free is math.nan:
             memory = get_hw_and_update(Hardware.HardwareType.Memory)
@@ -376,17 +405,40 @@ class Memory:
 
 
 class Disk:
+    @staticmethod
+    def stats():
+        try:
+            disk_used = Disk.disk_used()
+        except:
+            disk_used = ("-", "GB")
+
+        try:
+            disk_free = Disk.disk_free()
+        except:
+            disk_free = ("-", "GB")
+
+        try:
+            disk_total = Disk.disk_total()
+        except:
+            disk_total = ("-", "GB")
+
+        try:
+            disk_usage = Disk.disk_usage_percent()
+        except:
+            disk_usage = ("-", "%")
+
+        return (disk_used, disk_free, disk_total, disk_usage)
+
     @staticmethod
     def disk_usage_percent():
         # Attempting to retrieve data from AIDA64
-        sys_data = _get_data().get("sys", {})
         used_space = 0
         free_space = 0
-        for label, info in sys_data.items():
+        for label, value in AIDA64.items("sys"):
             if label.endswith(" Used Space"):
-                used_space += float(info.get("value", 0))
+                used_space += float(value)
             elif label.endswith(" Free Space"):
-                free_space += float(info.get("value", 0))
+                free_space += float(value)
 
         if used_space == 0 or free_space == 0:
             percent = psutil.disk_usage("/").percent
@@ -399,11 +451,10 @@ class Disk:
     @staticmethod
     def disk_used():
         # Attempting to retrieve data from AIDA64
-        sys_data = _get_data().get("sys", {})
         used_space = 0
-        for label, info in sys_data.items():
+        for label, value in AIDA64.items("sys"):
             if label.endswith(" Used Space"):
-                used_space += float(info.get("value", math.nan))
+                used_space += float(value)
 
         if used_space == 0:
             # bytes -> GB
@@ -413,11 +464,10 @@ class Disk:
 
     @staticmethod
     def disk_free():
-        sys_data = _get_data().get("sys", {})
         free_space = 0
-        for label, info in sys_data.items():
+        for label, value in AIDA64.items("sys"):
             if label.endswith(" Free Space"):
-                free_space += float(info.get("value", math.nan))
+                free_space += float(value)
 
         if free_space == 0:
             # bytes -> GB
@@ -427,14 +477,13 @@ class Disk:
     @staticmethod
     def disk_total():
         # Attempting to retrieve data from AIDA64
-        sys_data = _get_data().get("sys", {})
         used_space = 0
         free_space = 0
-        for label, info in sys_data.items():
+        for label, value in AIDA64.items("sys"):
             if label.endswith(" Used Space"):
-                used_space += float(info.get("value", 0))
+                used_space += float(value)
             elif label.endswith(" Free Space"):
-                free_space += float(info.get("value", 0))
+                free_space += float(value)
 
         if used_space == 0 or free_space == 0:
             used_space = psutil.disk_usage("/").used / (1024.0 ** 3)
@@ -446,18 +495,17 @@ class Net:
     @staticmethod
     def stats(interval):
         # Select the NIC with the highest download rate.
-        sys_data = _get_data().get("sys", {})
         label_to_index = [(" Download Rate", 0), (" Upload Rate", 2), (" Total Download", 1), (" Total Upload", 3)]
         stats_dict = {} # {key: [dl rate, downloaded, up rate, uploaded]}
         target = ""
 
         # Attempting to retrieve data from AIDA64
         dl_rate = None
-        for label, info in sys_data.items():
+        for label, value in AIDA64.items("sys"):
             key = label.split(" ")[0]
             for item in label_to_index:
                 if label.endswith(item[0]):
-                    value = float(info.get("value", 0))
+                    value = float(value)
                     if item[0] == " Download Rate" and (dl_rate is None or dl_rate < value):
                         dl_rate = value
                         target = key
@@ -495,3 +543,10 @@ class Net:
                     "downloaded": (res[1], "MB") # Amount of data downloaded
                 }
         return result
+
+
+# Metrics whose source is resolved once by stats.Registry
+DISCOVERERS = {
+    "cpu_usage": Cpu.discover_percentage,
+    "cpu_temperature": Cpu.discover_temperature
+}
@@ -0,0 +1,78 @@
+import os
+import sys
+import platform
+import configparser
+import udp_client
+import delta
+import cadence
+import history
+import recording
+import openmetrics
+import scheduler
+from stats import configure
+
+# Configuration and send loop shared by the GUI (main.py) and the headless entry point
+# (headless.py). Nothing here imports tkinter.
+
+EXE_PATH = os.path.dirname(sys.executable)
+
+if platform.system() not in ("Windows", "Linux"): # MAC
+    dirs = []
+    for dir_name in EXE_PATH.split("/"):
+        if dir_name.endswith(".app"): break
+        dirs.append(dir_name)
+    EXE_PATH = "/".join(dirs)
+
+CONFIGURATION_FILE_PATH = EXE_PATH + "/configuration.ini"
+
+
+class ConfigError(ValueError):
+    # Invalid value of one option of configuration.ini
+    def __init__(self, section, option, error):
+        super().__init__(f"[{section}] {option}: {error}")
+        self.section = section
+        self.option = option
+        self.error = error
+
+
+class Configuration(configparser.ConfigParser):
+    # ConfigParser whose typed getters name the section and option of an invalid value
+    def _typed(self, get, section, option, **kwargs):
+        try:
+            return get(section, option, **kwargs)
+        except ValueError as e:
+            raise ConfigError(section, option, e) from e
+
+    def getint(self, section, option, **kwargs):
+        return self._typed(super().getint, section, option, **kwargs)
+
+    def getfloat(self, section, option, **kwargs):
+        return self._typed(super().getfloat, section, option, **kwargs)
+
+    def getboolean(self, section, option, **kwargs):
+        return self._typed(super().getboolean, section, option, **kwargs)
+
+def load_configuration(config, path=CONFIGURATION_FILE_PATH):
+    # Reads the file into config and applies the [Sensors] section, False when it is missing
+    found = config.read(path)
+    configure(config)
+    return bool(found)
+
+def create_engine(config, targets, log=print):
+    # udp_client.Engine for the "ip[:port], ..." targets, set up from the configuration.
+    # ValueError on invalid targets, ConfigError (with a Configuration) on an invalid option.
+    targets = udp_client.parse_targets(targets)
+    pace = cadence.from_config(config)
+    # With an adaptive cadence, the groups its triggers watch are read every sample unless
+    # listed in [Schedule]; the others keep their own period
+    watched = {group: pace.sample_interval for group, _ in pace.fields} if pace else None
+    schedule = scheduler.from_config(config, 5, watched)
+    return udp_client.Engine(schedule.collect, targets, interval=schedule.interval, log=log,
+                             binary=config.getboolean("Wire", "binary", fallback=True),
+                             delta=delta.from_config(config),
+                             cadence=pace,
+                             # One sample per tick
+                             history=history.from_config(config, schedule.interval),
+                             metrics=openmetrics.from_config(config, schedule),
+                             recorder=recording.from_config(config),
+                             reports=[schedule])
@@ -0,0 +1,179 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import wire
+from collections import deque
+
+# Local stand-in for a Vobot Mini Dock, for running the send path, ack handling and cadence
+# logic offline. It speaks the current ack protocol ({"code": 200, "seq": n}), optionally
+# the binary wire format and keyframe + delta mode, and injects network trouble on the way
+# back: latency and jitter on every ack, lost packets (no ack), duplicated acks, reordered
+# acks (held back past the following ones) and slow acks (arriving after the sender's
+# timeout). Random draws come from a seeded generator so runs are repeatable.
+#
+#   python simulator.py --port 32123 --latency 20 --jitter 10 --loss 0.01
+#
+# In-process: loop.create_datagram_endpoint(lambda: DockSimulator(loss=0.05), local_addr=...)
+
+class DockSimulator(asyncio.DatagramProtocol):
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, duplicate=0.0, reorder=0.0, slow=0.0, slow_delay=5.0,
+                 binary=False, delta=False, echo_seq=True, seed=0, keep=100, recorder=None):
+        # latency / jitter / slow_delay in seconds, the others are probabilities per packet
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.slow = slow
+        self.slow_delay = slow_delay
+        self.binary = binary # decode the binary wire format
+        self.delta = delta # take keyframes + deltas
+        self.echo_seq = echo_seq # False: acks without "seq", like the docks that predate it
+        self.random = random.Random(seed)
+        self.received = deque(maxlen=keep) # (time, device_info) of the last decoded payloads
+        self.recorder = recorder # recording.Recorder of every decoded payload
+        self.schemas = {}
+        self.keyframe = None
+        self.transport = None
+        self.last_report = (time.monotonic(), 0, 0) # time, packets and bytes at the last summary
+        self.packets = 0
+        self.bytes = 0
+        self.payloads = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.acks = 0
+        self.duplicated = 0
+        self.reordered = 0
+        self.slowed = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def reply(self, data):
+        # Ack of one packet, the decoded payload or None
+        if data[:2] == wire.MAGIC:
+            if not self.binary: return ({"code": 500, "error": "Binary payload not supported"}, None)
+            seq = wire.sequence(data)
+            try:
+                device_info = wire.decode(data, self.schemas)
+            except KeyError:
+                ack = {"code": 409, "wire": wire.VERSION}
+                if self.echo_seq: ack["seq"] = seq
+                return (ack, None)
+            ack = {"code": 200, "wire": wire.VERSION, "seq": seq}
+            if device_info is None: return (ack, None)
+        else:
+            device_info = json.loads(data)
+            seq = device_info.get("Seq")
+            ack = {"code": 200}
+            if seq is not None: ack["seq"] = seq
+            if self.binary and device_info.get("Wire") == wire.VERSION: ack["wire"] = wire.VERSION
+
+        if self.delta:
+            ack["delta"] = 1
+            if "Keyframe" in device_info:
+                self.keyframe = device_info["Keyframe"]
+            elif "Delta" in device_info and device_info["Delta"] != self.keyframe:
+                ack.update(code=409, keyframe=True)
+        if not self.echo_seq: ack.pop("seq", None)
+        return (ack, device_info)
+
+    def datagram_received(self, data, addr):
+        self.packets += 1
+        self.bytes += len(data)
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        try:
+            ack, device_info = self.reply(data)
+        except Exception as e:
+            self.invalid += 1
+            ack, device_info = {"code": 500, "error": str(e)}, None
+        if device_info is not None:
+            self.payloads += 1
+            self.received.append((time.monotonic(), device_info))
+            if self.recorder is not None: self.recorder.append(device_info)
+
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if self.random.random() < self.reorder:
+            # Held back past the acks of the next packets
+            self.reordered += 1
+            delay += 2 * (self.latency + self.jitter) + 0.01
+        if self.random.random() < self.slow:
+            self.slowed += 1
+            delay = self.slow_delay
+        message = json.dumps(ack).encode()
+        loop = asyncio.get_running_loop()
+        loop.call_later(delay, self.send, message, addr)
+        if self.random.random() < self.duplicate:
+            self.duplicated += 1
+            loop.call_later(delay + 0.001, self.send, message, addr)
+
+    def send(self, message, addr):
+        if self.transport is None or self.transport.is_closing(): return
+        self.transport.sendto(message, addr)
+        self.acks += 1
+
+    def summary(self):
+        # Receive rate since the previous summary, totals since the start
+        now = time.monotonic()
+        since, packets, size = self.last_report
+        elapsed = max(now - since, 1e-9)
+        self.last_report = (now, self.packets, self.bytes)
+        return ("received %d packets (%.1f/s, %.1f KB/s), %d payloads, dropped %d, invalid %d, "
+                "acks %d (duplicated %d, reordered %d, slow %d)") % (
+            self.packets, (self.packets - packets) / elapsed, (self.bytes - size) / 1024 / elapsed, self.payloads,
+            self.dropped, self.invalid, self.acks, self.duplicated, self.reordered, self.slowed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local Vobot Mini Dock stand-in with network fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=32123)
+    parser.add_argument("--latency", type=float, default=0, help="ack delay, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="uniform +/- on the latency, ms")
+    parser.add_argument("--loss", type=float, default=0, help="probability a packet is dropped")
+    parser.add_argument("--duplicate", type=float, default=0, help="probability an ack is sent twice")
+    parser.add_argument("--reorder", type=float, default=0, help="probability an ack is held back")
+    parser.add_argument("--slow", type=float, default=0, help="probability an ack is sent after --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=5000, help="ms (default: %(default)s)")
+    parser.add_argument("--binary", action="store_true", help="accept the binary wire format")
+    parser.add_argument("--delta", action="store_true", help="accept keyframes + deltas")
+    parser.add_argument("--no-seq", dest="echo_seq", action="store_false", help="do not echo the sequence numbers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="append every received payload to this recording")
+    parser.add_argument("--report", type=float, default=10, help="seconds between two statistics lines")
+    return parser.parse_args(argv)
+
+async def serve(args):
+    recorder = None
+    if args.record:
+        import recording
+        recorder = recording.Recorder(args.record)
+    loop = asyncio.get_running_loop()
+    transport, dock = await loop.create_datagram_endpoint(
+        lambda: DockSimulator(args.latency / 1000, args.jitter / 1000, args.loss, args.duplicate, args.reorder,
+                              args.slow, args.slow_delay / 1000, args.binary, args.delta, args.echo_seq, args.seed,
+                              recorder=recorder),
+        local_addr=(args.host, args.port))
+    print(f"Dock simulator on {args.host}:{args.port}", flush=True)
+    try:
+        while True:
+            await asyncio.sleep(args.report)
+            print(dock.summary(), flush=True)
+    finally:
+        transport.close()
+        if recorder is not None: recorder.close()
+        print(dock.summary(), flush=True)
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,128 @@
+import time
 import platform
+from collections import Counter
+from sensors.lazy import LazyModule, loaded
+
+# Number of calls of each metric source since the last begin_tick(), counted by
+# Registry.read where the source is actually called.
+# Every source is expected to be read at most once per tick, see scheduler.Scheduler.collect.
+source_reads = Counter()
+
+class Registry:
+    # Runs the discovery of each metric source once and keeps the resolved source as a
+    # direct accessor. A failing accessor is resolved again on a later read, at most once
+    # every retry_after seconds, and a source is called at most once per read.
+    retry_after = 60 # seconds between two discoveries of a failing metric
+
+    def __init__(self, clock=time.monotonic):
+        self.discoverers = {} # {metric: discover() -> accessor()}
+        self.accessors = {}
+        self.discovered = {} # {metric: time of the last discovery}
+        self.failed = {} # {metric: time of the last failed discovery}
+        self.discoveries = Counter()
+        self.clock = clock
+
+    def invalidate(self):
+        # Forget every resolved source, e.g. after the configuration changed
+        self.accessors.clear()
+        self.discovered.clear()
+        self.failed.clear()
+
+    def register(self, metric, discover):
+        self.discoverers[metric] = discover
+        self.accessors.pop(metric, None)
+        self.discovered.pop(metric, None)
+        self.failed.pop(metric, None)
+
+    def read(self, metric):
+        now = self.clock()
+        accessor = self.accessors.get(metric)
+        if accessor is None:
+            failed_at = self.failed.get(metric)
+            if failed_at is not None and now - failed_at < self.retry_after:
+                raise LookupError(f"No source for {metric}")
+
+            self.discoveries[metric] += 1
+            self.discovered[metric] = now
+            try:
+                accessor = self.discoverers[metric]()
+            except Exception:
+                self.failed[metric] = now
+                raise
+            self.failed.pop(metric, None)
+            self.accessors[metric] = accessor
+
+        source_reads[metric] += 1
+        try:
+            return accessor()
+        except Exception:
+            # Resolve it again on a later read, once the source had retry_after seconds
+            if now - self.discovered[metric] >= self.retry_after: del self.accessors[metric]
+            raise
+
+REGISTRY = Registry()
+# By default a metric resolves to the plain backend getter
+for metric, getter in {
+    "cpu_usage": lambda: sensors.Cpu.percentage(interval=None),
+    "cpu_temperature": lambda: sensors.Cpu.temperature(),
+    "gpu": lambda: sensors.Gpu.stats(),
+    "memory": lambda: sensors.Memory.stats(),
+    "disk": lambda: sensors.Disk.stats(),
+    "network": lambda: sensors.Net.stats(None)
+}.items():
+    REGISTRY.register(metric, lambda getter=getter: getter)
+
+# [Sensors] section of configuration.ini, applied when the backend is loaded
+SENSOR_OPTIONS = None
+
+def _backend_loaded(module):
+    # Backends may resolve some metrics to a more direct source
+    for metric, discover in getattr(module, "DISCOVERERS", {}).items():
+        REGISTRY.register(metric, discover)
+    if SENSOR_OPTIONS is not None and hasattr(module, "configure"): module.configure(SENSOR_OPTIONS)
 
 # Determine the data source based on the computer operating system.
+# The backend is imported when a metric first needs it, usually by the first begin_tick().
 if platform.system() == 'Windows':
-    import sensors.sensors_windows as sensors
+    sensors = LazyModule("sensors.sensors_windows", _backend_loaded)
 else:
-    import sensors.sensors_python as sensors
+    sensors = LazyModule("sensors.sensors_python", _backend_loaded)
+
+
+def configure(config):
+    # Apply the [Sensors] section of configuration.ini to the backend
+    global SENSOR_OPTIONS
+    if not config.has_section("Sensors"): return
+    SENSOR_OPTIONS = dict(config.items("Sensors"))
+    if loaded(sensors) and hasattr(sensors, "configure"):
+        sensors.configure(SENSOR_OPTIONS)
+        REGISTRY.invalidate()
+
 
 class CPU:
     @staticmethod
     def percentage():
         try:
-            return sensors.Cpu.percentage(interval=1)
+            # Delta against the previous tick, never blocks
+            return REGISTRY.read("cpu_usage")
         except:
             return ("-", "%")
 
+    cores = [] # per-core usage of the last per_core() read, for the metrics endpoint
+
+    @staticmethod
+    def per_core():
+        # Per-core breakdown of the sample taken by percentage(), read with the CPU group
+        try:
+            CPU.cores = sensors.Cpu.per_core()
+        except:
+            CPU.cores = []
+        return CPU.cores
+
     @staticmethod
     def temperature():
         try:
-            return sensors.Cpu.temperature()
+            return REGISTRY.read("cpu_temperature")
         except:
             return ("-", "°")
 
@@ -26,64 +131,58 @@ class Gpu:
     @staticmethod
     def stats():
         try:
-            return sensors.Gpu.stats()
+            return REGISTRY.read("gpu")
         except:
             return (("-", "%"), ("-", "°"))
 
-
-class Memory:
     @staticmethod
-    def stats():
+    def devices():
+        # Per-device breakdown where the backend provides one
         try:
-            swap_percent = sensors.Memory.swap_percent()
-        except Exception:
-            swap_percent = ("-", "%")
-
-        try:
-            virtual_percent = sensors.Memory.virtual_percent()
+            return sensors.Gpu.devices()
         except:
-            virtual_percent = ("-", "%")
+            return []
 
+    @staticmethod
+    def timings():
+        # Seconds spent in the last GPU probe / query, where the backend measures them
         try:
-            virtual_used = sensors.Memory.virtual_used()
+            return sensors.Gpu.timings()
         except:
-            virtual_used = ("-", "MB")
+            return {}
 
+
+class Memory:
+    @staticmethod
+    def stats():
         try:
-            virtual_free = sensors.Memory.virtual_free()
+            return REGISTRY.read("memory")
         except:
-            virtual_free = ("-", "MB")
-
-        return (swap_percent, virtual_used, virtual_free, virtual_percent)
+            return (("-", "%"), ("-", "MB"), ("-", "MB"), ("-", "%"))
 
 
 class Disk:
     @staticmethod
     def stats():
         try:
-            disk_used = sensors.Disk.disk_used()
+            return REGISTRY.read("disk")
         except:
-            disk_used = ("-", "MB")
+            return (("-", "GB"), ("-", "GB"), ("-", "GB"), ("-", "%"))
 
-        try:
-            disk_free = sensors.Disk.disk_free()
-        except:
-            disk_free = ("-", "MB")
 
-        try:
-            disk_usage = sensors.Disk.disk_usage_percent()
-        except:
-            disk_usage = ("-", "%")
+class Net:
+    @staticmethod
+    def stats():
+        # Rates are computed over the measured time since the previous tick
+        return REGISTRY.read("network")
 
-        try:
-            disk_total = sensors.Disk.disk_total()
-        except:
-            disk_total = ("-", "MB")
 
-        return (disk_used, disk_free, disk_total, disk_usage)
+def begin_tick():
+    source_reads.clear()
+    # Let the backend drop what it cached during the previous tick
+    if hasattr(sensors, "begin_tick"): sensors.begin_tick()
 
 
-class Net:
-    @staticmethod
-    def stats():
-        return sensors.Net.stats(1)
\ No newline at end of file
+def reads_per_source():
+    # {source: reads} since the last begin_tick(), none above one
+    return dict(source_reads)
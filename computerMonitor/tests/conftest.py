@@ -0,0 +1,54 @@
+import os
+import sys
+import pytest
+from collections import Counter
+
+# The modules import each other by name, as when run from computerMonitor/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import stats
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend:
+    # Counts the calls of each source, failing the ones listed in `failing`
+    calls = Counter()
+    failing = set()
+
+    @staticmethod
+    def source(metric, value):
+        def read():
+            FakeBackend.calls[metric] += 1
+            if metric in FakeBackend.failing: raise OSError(f"{metric} failed")
+            return value
+        return read
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def registry(monkeypatch, clock):
+    # stats.REGISTRY with every metric resolved to a FakeBackend source
+    FakeBackend.calls = Counter()
+    FakeBackend.failing = set()
+    registry = stats.Registry(clock)
+    for metric, value in {
+        "cpu_usage": (37, "%"),
+        "cpu_temperature": (61, "°C"),
+        "gpu": ((12, "%"), (48, "°C")),
+        "memory": ((3, "%"), (6543, "MB"), (9876, "MB"), (41, "%")),
+        "disk": ((600, "GB"), (353, "GB"), (953, "GB"), (63, "%")),
+        "network": {"up_rate": (12.5, "KB/s")}
+    }.items():
+        registry.register(metric, lambda metric=metric, value=value: FakeBackend.source(metric, value))
+    monkeypatch.setattr(stats, "REGISTRY", registry)
+    monkeypatch.setattr(stats, "sensors", FakeBackend)
+    return registry
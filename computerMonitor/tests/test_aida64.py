@@ -0,0 +1,73 @@
+import os
+import pytest
+from sensors import aida64
+
+# Dump of an "AIDA64_SensorValues" block (XML then zero padding, 2400 bytes). It lists
+# "GPU Diode" twice, as AIDA64 does when two sources report the same sensor id.
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "aida64_sensor_values.bin")
+
+@pytest.fixture
+def block():
+    with open(FIXTURE, "rb") as f:
+        return f.read()
+
+class RecordedSource(aida64.SharedMemorySource):
+    # The shared memory block of the fixture: a longer mapping is a PermissionError
+    def __init__(self, block):
+        super().__init__()
+        self.block = block
+        self.reads = []
+
+    def _read(self, length):
+        self.reads.append(length)
+        if length > len(self.block): raise PermissionError("Access is denied")
+        return self.block[:length]
+
+
+def test_parse(block):
+    index = aida64.parse(block.rstrip(b"\x00"))
+    assert index[("sys", "CPU Utilization")] == "12"
+    assert index[("temp", "CPU Package")] == "54"
+    assert index[("pwr", "CPU Package")] == "28.41"
+    assert len(index) == 18
+    assert aida64.parse(b"") == {}
+    assert aida64.parse(None) == {}
+
+def test_source_finds_the_block_size(block):
+    source = RecordedSource(block)
+    data = source()
+    assert data == block.rstrip(b"\x00")
+    assert 1364 < source.length <= len(block)
+    # Later reads map the size found once
+    source.reads.clear()
+    assert source() == data
+    assert source.reads == [source.length]
+
+def test_missing_sensors(block):
+    reader = aida64.Aida64(lambda: block.rstrip(b"\x00"))
+    assert reader.value("sys", "Used Virtual Memory") is None
+    assert reader.value("sys", "Used Virtual Memory", "-") == "-"
+    assert reader.value("temp", "GPU2 Diode", 0) == 0
+    assert reader.items("curr") == []
+    # No block (AIDA64 not running) or a garbled one: every sensor is missing
+    for data in (None, b"<sys><id>SCPUUTI</id><label>CPU Util"):
+        reader = aida64.Aida64(lambda: data)
+        assert reader.value("sys", "CPU Utilization") is None
+        assert reader.items("temp") == []
+
+def test_duplicate_id(block):
+    reader = aida64.Aida64(lambda: block.rstrip(b"\x00"))
+    # The later entry is the current value, listed once
+    assert reader.value("temp", "GPU Diode") == "49"
+    assert reader.items("temp") == [("Motherboard", "36"), ("CPU Package", "54"), ("CPU Core #1", "51"),
+                                    ("CPU Core #2", "53"), ("GPU Diode", "49")]
+
+def test_parsed_once_per_tick(block):
+    reads = []
+    reader = aida64.Aida64(lambda: reads.append(1) or block.rstrip(b"\x00"))
+    for _ in range(5): reader.value("sys", "CPU Utilization")
+    reader.items("temp")
+    assert (len(reads), reader.parses) == (1, 1)
+    reader.invalidate()
+    reader.value("sys", "CPU Utilization")
+    assert (len(reads), reader.parses) == (2, 2)
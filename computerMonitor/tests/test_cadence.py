@@ -0,0 +1,31 @@
+import cadence
+
+def sample(usage, temperature=50):
+    return {"CPU": {"usage": (usage, "%"), "temperature": (temperature, "°C")}}
+
+def run(pace, clock, samples):
+    # Feeds one sample every sample_interval, the times of the pushed ones
+    pushed = []
+    for device_info in samples:
+        if pace.due(device_info, clock.now): pushed.append(clock.now - 1000)
+        clock.now += pace.sample_interval
+    return pushed
+
+
+def test_threshold_and_heartbeat(clock):
+    pace = cadence.Cadence(0.5, 1, 5, {("CPU", "usage"): 10})
+    assert run(pace, clock, [sample(20)] * 3 + [sample(25), sample(40)] + [sample(40)] * 13) == [0, 2.0, 7.0]
+    assert pace.reasons == {"first": 1, "CPU.usage": 1, "heartbeat": 1}
+
+def test_crossing_inside_min_interval_is_latched(clock):
+    pace = cadence.Cadence(0.5, 2, 30, levels={("CPU", "temperature"): (85,)})
+    # Over 85 °C for a single sample, 0.5 s after the first push
+    samples = [sample(20, 60), sample(20, 90)] + [sample(20, 60)] * 6
+    assert run(pace, clock, samples) == [0, 2.0]
+    assert pace.reasons["CPU.temperature"] == 1
+    # Nothing pending after the push
+    assert run(pace, clock, [sample(20, 60)] * 4) == []
+
+def test_nan_change_triggers(clock):
+    pace = cadence.Cadence(0.5, 1, 30, {("CPU", "usage"): 10})
+    assert run(pace, clock, [sample(20), sample(20), sample("-"), sample("-"), sample("-")]) == [0, 1.0]
@@ -0,0 +1,23 @@
+import delta
+
+PAYLOAD = {"CPU": {"usage": (37, "%"), "temperature": (61, "°C")}, "IP": "192.168.1.20"}
+
+
+def test_delta_carries_changed_fields():
+    frames = delta.KeyframeDelta(thresholds={("CPU", "temperature"): 2})
+    assert frames.next(PAYLOAD) == (True, 1, PAYLOAD)
+    assert frames.next(dict(PAYLOAD, CPU={"usage": (40, "%"), "temperature": (62, "°C")})) == \
+        (False, 1, {"CPU": {"usage": (40, "%")}})
+    assert frames.next(dict(PAYLOAD, Stale=["GPU"])) == (False, 1, {"Stale": ["GPU"]})
+
+def test_removed_field_forces_a_keyframe():
+    frames = delta.KeyframeDelta()
+    frames.next(dict(PAYLOAD, Stale=["GPU"]))
+    assert frames.next(dict(PAYLOAD, Stale=["GPU"])) == (False, 1, {})
+    # The groups recovered: only a keyframe tells the dock "Stale" is gone
+    assert frames.next(PAYLOAD) == (True, 2, PAYLOAD)
+    assert frames.next(PAYLOAD) == (False, 2, {})
+
+def test_keyframe_interval():
+    frames = delta.KeyframeDelta(interval=2)
+    assert [frames.next(PAYLOAD)[0] for _ in range(6)] == [True, False, False, True, False, False]
@@ -0,0 +1,45 @@
+import math
+import random
+import history
+from array import array
+
+def float32(value):
+    # The ring stores float32, the statistics are of the stored values
+    return array('f', [value])[0]
+
+def stream(count, seed=0):
+    # Load-like samples with gaps (NaN, e.g. a sensor that did not answer)
+    rand = random.Random(seed)
+    return [math.nan if rand.random() < 0.05 else rand.choice((rand.uniform(0, 100), rand.uniform(0, 5), 0.0))
+            for _ in range(count)]
+
+
+def test_window_aggregates_match_brute_force():
+    sizes = (1, 7, 60, 300)
+    ring = history.Ring(300, sizes)
+    samples = stream(2000)
+    for i, value in enumerate(samples):
+        ring.add(value)
+        for size in sizes:
+            window = [float32(value) for value in samples[max(0, i + 1 - size):i + 1] if not math.isnan(value)]
+            low, high, mean, p95 = ring.windows[size].stats()
+            if not window:
+                assert all(math.isnan(stat) for stat in (low, high, mean, p95))
+                continue
+            assert (low, high) == (min(window), max(window))
+            assert math.isclose(mean, sum(window) / len(window), rel_tol=1e-9, abs_tol=1e-6)
+            exact = sorted(window)[len(window) - 1 - int(len(window) * 5 / 100)]
+            assert exact * (1 - 1e-9) <= p95 <= exact * history.GROWTH * (1 + 1e-9)
+
+def test_p95_within_one_bucket():
+    # The p95 is the upper bound of the log bucket of the exact value: at most GROWTH times it
+    rand = random.Random(1)
+    for size in (20, 100, 720):
+        ring = history.Ring(size, (size,))
+        for _ in range(3 * size): ring.add(rand.lognormvariate(3, 1.5))
+        window = sorted(ring.last(size))
+        # Nearest rank: more than 5% of the samples are at or above it
+        exact = window[len(window) - 1 - int(len(window) * 5 / 100)]
+        p95 = ring.windows[size].percentile(95)
+        assert exact <= p95 <= exact * history.GROWTH
+        assert p95 <= window[-1]
@@ -0,0 +1,116 @@
+import os
+import sys
+import math
+import time
+import pytest
+import platform
+from sensors import nvidia
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="the fake nvidia-smi is a shell script")
+
+# Stand-in for "nvidia-smi --query-gpu=... --format=csv,noheader,nounits -lms N", driven by
+# FAKE_SMI_MODE: loop (a line per device every N ms), exit (one pass then exit), hang (one
+# pass then no more output), fail (exit code 1 without output, like a version without -lms). Every start is appended to FAKE_SMI_STARTS.
+FAKE_SMI = """#!%s
+import os, sys, time
+with open(os.environ["FAKE_SMI_STARTS"], "a") as f: f.write("start\\n")
+period = int(sys.argv[sys.argv.index("-lms") + 1]) / 1000.0
+mode = os.environ["FAKE_SMI_MODE"]
+if mode == "fail": sys.exit(1)
+lines = os.environ["FAKE_SMI_LINES"].split(";")
+while True:
+    for line in lines: print(line, flush=True)
+    if mode == "exit": sys.exit(0)
+    if mode == "hang": time.sleep(3600)
+    time.sleep(period)
+"""
+
+LINES = "0, NVIDIA GeForce RTX 3080, 42, 2048, 10240, 65;1, Tesla T4, 7, 100, 15360, 40"
+
+
+@pytest.fixture
+def fake_smi(tmp_path, monkeypatch):
+    path = tmp_path / "nvidia-smi"
+    path.write_text(FAKE_SMI % sys.executable)
+    path.chmod(0o755)
+    starts = tmp_path / "starts"
+    starts.write_text("")
+    monkeypatch.setenv("PATH", str(tmp_path) + os.pathsep + os.environ.get("PATH", ""))
+    monkeypatch.setenv("FAKE_SMI_STARTS", str(starts))
+    monkeypatch.setenv("FAKE_SMI_MODE", "loop")
+    monkeypatch.setenv("FAKE_SMI_LINES", LINES)
+    return lambda: len(starts.read_text().split())
+
+@pytest.fixture
+def reader():
+    reader = nvidia.NvidiaSmiReader(period_ms=100)
+    yield reader
+    reader.stop()
+
+
+def test_parse_line():
+    assert nvidia.parse_line("0, NVIDIA GeForce RTX 3080, 42, 2048, 10240, 65\n") == \
+        nvidia.Device(0, "NVIDIA GeForce RTX 3080", 42.0, 2048.0, 10240.0, 65.0)
+    assert nvidia.parse_line("garbage") is None
+    assert nvidia.parse_line("x, name, 1, 2, 3, 4") is None
+
+def test_loop_starts_and_parses(fake_smi, reader):
+    devices = reader.devices(timeout=5)
+    assert [device.index for device in devices] == [0, 1]
+    assert devices[0] == nvidia.Device(0, "NVIDIA GeForce RTX 3080", 42.0, 2048.0, 10240.0, 65.0)
+    assert devices[1].name == "Tesla T4"
+    assert reader.running()
+    # Later reads take the lines of the same loop
+    time.sleep(0.3)
+    assert reader.devices() == devices
+    assert fake_smi() == 1
+
+def test_restart_after_exit(fake_smi, reader, monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_MODE", "exit")
+    assert len(reader.devices(timeout=5)) == 2
+    reader.process.wait(timeout=5)
+    assert not reader.running()
+    assert len(reader.devices(timeout=5)) == 2
+    assert fake_smi() == 2
+
+def test_stale_output_times_out(fake_smi, reader, monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_MODE", "hang")
+    assert len(reader.devices(timeout=5)) == 2
+    # Output older than 3 periods + 1 s
+    reader.updated -= 2
+    with pytest.raises(TimeoutError):
+        reader.devices()
+    assert reader.process is None
+    # The next read starts a new loop
+    assert len(reader.devices(timeout=5)) == 2
+    assert fake_smi() == 2
+
+def test_no_output_times_out(fake_smi, reader, monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_LINES", "")
+    with pytest.raises(TimeoutError):
+        reader.devices(timeout=0.3)
+    # Still starting: the loop is kept for the next read
+    assert reader.running()
+    reader.started -= reader.startup
+    with pytest.raises(TimeoutError):
+        reader.devices(timeout=0.1)
+    assert reader.process is None
+
+def test_loop_not_supported(fake_smi, reader, monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_MODE", "fail")
+    with pytest.raises(nvidia.LoopNotSupported):
+        reader.devices(timeout=5)
+    assert reader.process is None
+
+def test_not_available_fields(fake_smi, reader, monkeypatch):
+    monkeypatch.setenv("FAKE_SMI_LINES", "0, Quadro P400, [N/A], 300, 2048, [Not Supported]")
+    device, = reader.devices(timeout=5)
+    assert device.name == "Quadro P400"
+    assert math.isnan(device.utilization)
+    assert math.isnan(device.temperature)
+    assert device.memory_used == 300.0
+
+def test_not_installed(tmp_path, monkeypatch, reader):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        reader.devices()
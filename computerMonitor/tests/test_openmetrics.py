@@ -0,0 +1,78 @@
+import stats
+import pytest
+import scheduler
+import udp_client
+import openmetrics
+from sensors.nvidia import Device
+from test_wire import PAYLOAD
+
+@pytest.fixture
+def endpoint(monkeypatch, clock):
+    # Endpoint after one tick of a known engine state, no socket is opened
+    monkeypatch.setattr(stats.CPU, "cores", [(40, "%"), (2, "%")])
+    monkeypatch.setattr(stats.Gpu, "devices", staticmethod(lambda: [Device(0, "Tesla T4", 7.0, 100.0, 15360.0, 40.0)]))
+    monkeypatch.setattr(stats.Gpu, "timings", staticmethod(lambda: {"probe": 0.25, "query": 0.002, "backend": "NVIDIA"}))
+    schedule = scheduler.Scheduler({"CPU": 1, "IP": 60}, groups=[("CPU", lambda: PAYLOAD["CPU"]), ("IP", lambda: "-")], clock=clock)
+    schedule.collect()
+    schedule.close()
+    engine = udp_client.Engine(None, [("192.168.1.20", udp_client.DEFAULT_PORT)], log=lambda text: None)
+    engine.collect_seconds = 0.012
+    target, = engine.targets
+    target.sent, target.acked, target.timeouts, target.late = 10, 8, 1, 1
+    for seconds in (0.0004, 0.003, 0.003, 0.04, 7.5):
+        target.rtt.add(seconds)
+    endpoint = openmetrics.MetricsEndpoint(scheduler=schedule)
+    endpoint.update(dict(PAYLOAD, Stale=["IP"]), engine)
+    return endpoint
+
+def samples(body):
+    # {name{labels}: value} of the sample lines
+    return dict(line.rsplit(" ", 1) for line in body.splitlines() if line and not line.startswith("#"))
+
+
+def test_render(endpoint):
+    body = endpoint.render().decode()
+    assert body.endswith("\n# EOF\n")
+    assert body.count("# EOF") == 1
+    values = samples(body)
+    assert values["computer_monitor_cpu_usage_ratio"] == "0.37"
+    assert values["computer_monitor_memory_free_bytes"] == str(float(9876 * 1024 ** 2))
+    assert values['computer_monitor_group_stale{group="IP"}'] == "1"
+    assert values['computer_monitor_cpu_core_usage_ratio{core="0"}'] == "0.4"
+    assert values['computer_monitor_gpu_device_memory_total_bytes{gpu="0",name="Tesla T4"}'] == str(15360.0 * 1024 ** 2)
+    assert values['computer_monitor_gpu_probe_seconds{backend="NVIDIA"}'] == "0.25"
+
+def test_counters_have_the_total_suffix(endpoint):
+    lines = endpoint.render().decode().splitlines()
+    counters = {line.split()[2] for line in lines if line.startswith("# TYPE ") and line.endswith(" counter")}
+    assert "computer_monitor_network_receive_bytes" in counters
+    assert "computer_monitor_packets_sent" in counters
+    for line in lines:
+        if line.startswith("#"): continue
+        name = line.split("{")[0].split(" ")[0]
+        if name.endswith("_total"): assert name[:-len("_total")] in counters
+        else: assert name not in counters
+    values = samples("\n".join(lines))
+    assert values['computer_monitor_packets_sent_total{target="192.168.1.20"}'] == "10"
+    assert values['computer_monitor_packets_lost_total{target="192.168.1.20"}'] == "1"
+    assert values["computer_monitor_network_transmit_bytes_total"] == str(1520.3 * 1024 ** 2)
+
+def test_rtt_histogram(endpoint):
+    values = samples(endpoint.render().decode())
+    name = "computer_monitor_ack_rtt_seconds"
+    label = 'target="192.168.1.20"'
+    assert values[f'{name}_bucket{{{label},le="0.001"}}'] == "1"
+    assert values[f'{name}_bucket{{{label},le="0.005"}}'] == "3"
+    assert values[f'{name}_bucket{{{label},le="5"}}'] == "4"
+    # The 7.5 s ack is only in +Inf, which equals the count
+    assert values[f'{name}_bucket{{{label},le="+Inf"}}'] == "5"
+    assert values[f"{name}_count{{{label}}}"] == "5"
+    assert float(values[f"{name}_sum{{{label}}}"]) == pytest.approx(7.5464)
+
+def test_rendered_once_per_tick(endpoint):
+    body = endpoint.render()
+    assert endpoint.render() is body
+    assert endpoint.renders == 1
+    endpoint.update(PAYLOAD, endpoint.engine)
+    assert endpoint.render() is not body
+    assert endpoint.renders == 2
@@ -0,0 +1,38 @@
+import os
+import pytest
+import platform
+from sensors import procfs
+
+pytestmark = pytest.mark.skipif(platform.system() != "Linux", reason="reads /proc")
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_open_failure_closes_the_open_files(monkeypatch):
+    open_file = procfs.ProcFile
+    def proc_file(path, size=4096):
+        if path == "/proc/net/dev": raise PermissionError(path)
+        return open_file(path, size)
+    monkeypatch.setattr(procfs, "ProcFile", proc_file)
+    before = open_fds()
+    with pytest.raises(PermissionError):
+        procfs.ProcFs()
+    assert procfs.open_procfs() is None
+    assert open_fds() == before
+
+def test_parse_failure_closes_the_files(monkeypatch):
+    monkeypatch.setattr(procfs.ProcFs, "memory", lambda self: int("unexpected"))
+    before = open_fds()
+    assert procfs.open_procfs() is None
+    assert open_fds() == before
+
+def test_open_procfs():
+    reader = procfs.open_procfs()
+    try:
+        assert reader.cpu_times()
+        total, free, used, percent, swap_percent = reader.memory()
+        assert 0 < free <= total and 0 <= percent <= 100
+        assert isinstance(reader.net_counters(), dict)
+    finally:
+        reader.close()
@@ -0,0 +1,56 @@
+import pytest
+import recording
+
+PAYLOAD = {"CPU": {"usage": [37, "%"]}, "IP": "192.168.1.20"}
+
+
+def test_append_and_read(tmp_path):
+    path = tmp_path / "a.vbrec"
+    recorder = recording.Recorder(str(path))
+    recorder.append(PAYLOAD, now=recorder.start + 1.5)
+    recorder.append(dict(PAYLOAD, IP="-"), now=recorder.start + 2.5)
+    recorder.close()
+    assert list(recording.read(str(path))) == [(1.5, PAYLOAD), (2.5, dict(PAYLOAD, IP="-"))]
+
+def test_record_cut_short_is_dropped(tmp_path):
+    path = tmp_path / "a.vbrec"
+    recorder = recording.Recorder(str(path))
+    recorder.append(PAYLOAD, now=recorder.start + 1)
+    recorder.close()
+    with open(path, "ab") as f: f.write(recording.RECORD.pack(100, 2.0) + b'{"CPU"')
+
+    recorder = recording.Recorder(str(path))
+    recorder.append(PAYLOAD)
+    recorder.close()
+    records = list(recording.read(str(path)))
+    assert len(records) == 2
+    assert records[1][0] >= 1
+
+def test_header_cut_short_starts_over(tmp_path):
+    path = tmp_path / "a.vbrec"
+    path.write_bytes(recording.MAGIC[:3])
+    recorder = recording.Recorder(str(path))
+    recorder.append(PAYLOAD)
+    recorder.close()
+    assert [device_info for _, device_info in recording.read(str(path))] == [PAYLOAD]
+
+@pytest.mark.parametrize("content", [b"hello\n", b"VBREX" + bytes(20)])
+def test_not_a_recording(tmp_path, content):
+    path = tmp_path / "a.vbrec"
+    path.write_bytes(content)
+    with pytest.raises(recording.RecordingError, match="not a recording"):
+        recording.Recorder(str(path))
+    assert path.read_bytes() == content
+
+def test_missing_directory(tmp_path):
+    with pytest.raises(recording.RecordingError, match="Cannot open"):
+        recording.Recorder(str(tmp_path / "missing" / "a.vbrec"))
+
+def test_replay_speed():
+    import replay
+    assert replay.parse_args(["x.vbrec", "-t", "127.0.0.1"]).speed == 1.0
+    assert replay.parse_args(["x.vbrec", "-t", "127.0.0.1", "-s", "max"]).speed == 0.0
+    assert replay.parse_args(["x.vbrec", "-t", "127.0.0.1", "-s", "2.5"]).speed == 2.5
+    for speed in ("fast", "0", "-1", "nan", "inf"):
+        with pytest.raises(SystemExit):
+            replay.parse_args(["x.vbrec", "-t", "127.0.0.1", "-s", speed])
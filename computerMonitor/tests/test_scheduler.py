@@ -0,0 +1,58 @@
+import stats
+import pytest
+import scheduler
+import collector
+from conftest import FakeBackend
+
+SOURCES = {"cpu_usage", "cpu_temperature", "gpu", "memory", "disk", "network"}
+
+@pytest.fixture
+def schedule(registry, clock):
+    groups = [(name, (lambda: "192.168.1.20") if name == "IP" else read) for name, read in collector.GROUPS]
+    periods = {name: 5 for name, _ in groups}
+    periods["Disk"] = 60
+    schedule = scheduler.Scheduler(periods, groups=groups, clock=clock)
+    yield schedule
+    schedule.close()
+
+
+def test_each_source_read_once_per_tick(schedule, clock):
+    device_info = schedule.collect()
+    assert stats.reads_per_source() == dict.fromkeys(SOURCES, 1)
+    assert device_info["CPU"] == {"usage": (37, "%"), "temperature": (61, "°C")}
+    assert device_info["IP"] == "192.168.1.20"
+    assert "Stale" not in device_info
+
+    # Nothing due: cached values, no read
+    clock.now += 1
+    assert schedule.collect() == device_info
+    assert stats.reads_per_source() == {}
+
+    clock.now += 4
+    schedule.collect()
+    assert stats.reads_per_source() == dict.fromkeys(SOURCES - {"disk"}, 1)
+    assert FakeBackend.calls["disk"] == 1
+
+def test_failing_group_is_stale(schedule, registry):
+    FakeBackend.failing.add("network")
+    device_info = schedule.collect()
+    assert device_info["Network"] == collector.PLACEHOLDERS["Network"]
+    assert device_info["Stale"] == ["Network"]
+
+def test_close_stops_the_workers(schedule):
+    schedule.collect()
+    workers = [group.worker for group in schedule.groups]
+    schedule.close()
+    for worker in workers: worker.join(1)
+    assert not any(worker.is_alive() for worker in workers)
+
+def test_cadence_reads_only_the_watched_groups_every_sample():
+    import service
+    import configparser
+    config = configparser.ConfigParser()
+    config.read_string("[Cadence]\nenabled = yes\nsample_interval = 0.5\ncpu.usage = 10\n[Schedule]\nnetwork = 1\n")
+    engine = service.create_engine(config, "127.0.0.1")
+    schedule, = engine.reports
+    assert {group.name: group.period for group in schedule.groups} == \
+        {"Network": 1, "CPU": 0.5, "GPU": 5, "Memory": 5, "Disk": 5, "IP": 5}
+    assert engine.interval == 0.5
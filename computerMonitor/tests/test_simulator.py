@@ -0,0 +1,96 @@
+import delta
+import asyncio
+import udp_client
+from simulator import DockSimulator
+from test_wire import PAYLOAD
+
+# Engine against a DockSimulator on localhost, through real sockets
+
+def run(test, dock=None, **engine_options):
+    # Runs test(engine, dock) with an Engine sending to a simulator on a free local port
+    async def main():
+        loop = asyncio.get_running_loop()
+        transport, simulator = await loop.create_datagram_endpoint(lambda: dock or DockSimulator(),
+                                                                   local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+        engine = udp_client.Engine(lambda: PAYLOAD, [("127.0.0.1", port)], log=lambda text: None, **engine_options)
+        engine.ack_timeout = 0.2
+        await engine.open()
+        try:
+            await test(engine, simulator)
+        finally:
+            engine.close()
+            transport.close()
+    asyncio.run(main())
+
+async def push(engine, count=1):
+    for _ in range(count):
+        engine.push(PAYLOAD)
+        await asyncio.sleep(0.02)
+    # Acks and timeouts settle
+    await asyncio.sleep(engine.ack_timeout + 0.1)
+
+
+def test_acks():
+    async def test(engine, dock):
+        await push(engine, 5)
+        target, = engine.targets
+        assert (target.sent, target.acked, target.timeouts, target.late, target.errors) == (5, 5, 0, 0, 0)
+        assert target.pending == {}
+        assert [device_info["Seq"] for _, device_info in dock.received] == [1, 2, 3, 4, 5]
+    run(test, binary=False)
+
+def test_lost_packets_time_out():
+    async def test(engine, dock):
+        await push(engine, 3)
+        target, = engine.targets
+        assert (target.sent, target.acked, target.timeouts) == (3, 0, 3)
+        assert target.pending == {}
+    run(test, DockSimulator(loss=1.0), binary=False)
+
+def test_duplicated_acks_are_late():
+    async def test(engine, dock):
+        await push(engine, 3)
+        target, = engine.targets
+        assert (target.acked, target.late, target.errors) == (3, 3, 0)
+    run(test, DockSimulator(duplicate=1.0), binary=False)
+
+def test_acks_without_seq():
+    async def test(engine, dock):
+        await push(engine, 3)
+        target, = engine.targets
+        assert (target.sent, target.acked, target.timeouts, target.late) == (3, 3, 0, 0)
+    run(test, DockSimulator(echo_seq=False), binary=False)
+
+def test_schema_renegotiation():
+    async def test(engine, dock):
+        target, = engine.targets
+        # JSON offer, then binary with a schema announcement
+        await push(engine, 2)
+        assert target.wire == 1 and target.schema_id is not None
+        sent = target.sent
+        # The dock restarted and lost the schema: 409, the next push announces it again
+        dock.schemas.clear()
+        await push(engine, 2)
+        assert target.requests == 1
+        # data (409), announcement + data
+        assert target.sent == sent + 3
+        assert (target.errors, target.timeouts) == (0, 0)
+        assert len(dock.schemas) == 1
+        assert dock.received[-1][1]["CPU"] == PAYLOAD["CPU"]
+    run(test, DockSimulator(binary=True), binary=True)
+
+def test_keyframe_renegotiation():
+    async def test(engine, dock):
+        target, = engine.targets
+        await push(engine, 3)
+        assert target.delta
+        # The dock lost the keyframe: 409, the next push is a keyframe
+        dock.keyframe = None
+        await push(engine)
+        assert target.requests == 1
+        assert engine.delta.requested
+        await push(engine)
+        assert dock.keyframe == engine.delta.seq
+        assert (target.errors, target.timeouts) == (0, 0)
+    run(test, DockSimulator(delta=True), binary=False, delta=delta.KeyframeDelta())
@@ -0,0 +1,53 @@
+import stats
+from conftest import FakeBackend
+
+
+def tick():
+    stats.begin_tick()
+    return (stats.CPU.percentage(), stats.CPU.temperature(), stats.Gpu.stats(), stats.Memory.stats(),
+            stats.Disk.stats(), stats.Net.stats())
+
+
+def test_steady_state_ticks_skip_discovery(registry):
+    tick()
+    discoveries = dict(registry.discoveries)
+    assert discoveries == dict.fromkeys(stats.source_reads, 1)
+    for _ in range(5):
+        assert tick()[0] == (37, "%")
+        assert registry.discoveries == discoveries
+        assert stats.source_reads == dict.fromkeys(discoveries, 1)
+    assert FakeBackend.calls == dict.fromkeys(discoveries, 6)
+
+def test_failing_source_is_read_once_per_tick(registry, clock):
+    FakeBackend.failing.add("disk")
+    for _ in range(5):
+        assert tick()[4] == (("-", "GB"), ("-", "GB"), ("-", "GB"), ("-", "%"))
+        assert stats.source_reads["disk"] == 1
+        clock.now += 5
+    assert FakeBackend.calls["disk"] == 5
+    assert registry.discoveries["disk"] == 1
+
+def test_failing_source_is_rediscovered_after_retry_after(registry, clock):
+    tick()
+    FakeBackend.failing.add("disk")
+    clock.now += registry.retry_after
+    tick()
+    assert registry.discoveries["disk"] == 1
+    tick()
+    assert registry.discoveries["disk"] == 2
+    assert stats.source_reads["disk"] == 1
+    FakeBackend.failing.clear()
+    assert tick()[4][2] == (953, "GB")
+    assert registry.discoveries["disk"] == 2
+
+def test_failed_discovery_waits_retry_after(registry, clock):
+    def discover():
+        raise LookupError("no sensor")
+    registry.register("cpu_temperature", discover)
+    tick()
+    tick()
+    assert registry.discoveries["cpu_temperature"] == 1
+    assert "cpu_temperature" not in stats.source_reads
+    clock.now += registry.retry_after
+    tick()
+    assert registry.discoveries["cpu_temperature"] == 2
@@ -0,0 +1,108 @@
+import wire
+import delta
+import asyncio
+import pytest
+import udp_client
+
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, message, address):
+        self.sent.append((message, address))
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def engine():
+    # Engine with its loop and transport set up, no socket: packets are sent and acked by hand
+    engine = udp_client.Engine(lambda: {}, [("192.168.1.20", udp_client.DEFAULT_PORT), ("192.168.1.20", 40000),
+                                            ("192.168.1.21", udp_client.DEFAULT_PORT)], log=lambda text: None)
+    engine.loop = asyncio.new_event_loop()
+    engine.transport = FakeTransport()
+    yield engine
+    engine.close()
+    engine.loop.close()
+
+def send(engine, target):
+    seq = target.next_seq()
+    engine.send(target, b"{}", seq)
+    return seq
+
+
+def test_parse_ack():
+    assert udp_client.parse_ack(b'{"code": 200, "seq": 12}') == {"code": 200, "seq": 12}
+    assert udp_client.parse_ack(b'{"code": 200, "wire": 1, "keyframe": true}') == {"code": 200, "wire": 1, "keyframe": True}
+    # Python literals, as the docks that reply with repr() send them
+    assert udp_client.parse_ack(b"{'code': 500, 'error': 'It\\'s full', 'seq': None}") == \
+        {"code": 500, "error": "It's full", "seq": None}
+    assert udp_client.parse_ack(b"{'code': 200, 'load': 0.5, 'ok': True}") == {"code": 200, "load": 0.5, "ok": True}
+    for data in (b"", b"[200]", b"200", b"{'code': 200", b"__import__('os').getcwd()", b"{'code': len('x')}"):
+        with pytest.raises(ValueError):
+            udp_client.parse_ack(data)
+
+def test_ack_matches_seq(engine):
+    target = engine.targets[0]
+    first, second = send(engine, target), send(engine, target)
+    # Acks may come back in any order and from another port of the dock
+    engine.acknowledge(b'{"code": 200, "seq": %d}' % second, ("192.168.1.20", 50000))
+    assert list(target.pending) == [first]
+    engine.acknowledge(b'{"code": 200, "seq": %d}' % first, ("192.168.1.20", 50000))
+    assert target.pending == {}
+    assert (target.acked, target.late, target.errors) == (2, 0, 0)
+
+def test_ack_picks_the_target_by_seq(engine):
+    # Two docks behind one IP
+    default, other = engine.targets[:2]
+    send(engine, default)
+    seq = send(engine, other)
+    send(engine, other)
+    engine.acknowledge(b'{"code": 200, "seq": %d}' % seq, ("192.168.1.20", 40000))
+    assert (default.acked, other.acked) == (0, 1)
+    # Only the other dock has seq 2 in flight, whatever the port the ack comes from
+    engine.acknowledge(b'{"code": 200, "seq": 2}', ("192.168.1.20", udp_client.DEFAULT_PORT))
+    assert (default.acked, other.acked) == (0, 2)
+
+def test_late_and_duplicate_acks(engine):
+    target = engine.targets[2]
+    seq = send(engine, target)
+    ack = b'{"code": 200, "seq": %d}' % seq
+    engine.acknowledge(ack, ("192.168.1.21", udp_client.DEFAULT_PORT))
+    engine.acknowledge(ack, ("192.168.1.21", udp_client.DEFAULT_PORT))
+    assert (target.acked, target.late) == (1, 1)
+    # Ack of a packet that already timed out
+    seq = send(engine, target)
+    engine.expire(target, seq)
+    engine.acknowledge(b'{"code": 200, "seq": %d}' % seq, ("192.168.1.21", udp_client.DEFAULT_PORT))
+    assert (target.acked, target.timeouts, target.late) == (1, 1, 2)
+    # Unknown sender
+    engine.acknowledge(ack, ("192.168.1.99", udp_client.DEFAULT_PORT))
+    assert target.late == 2
+
+def test_ack_without_seq_takes_the_oldest_packet(engine):
+    target = engine.targets[2]
+    first, second = send(engine, target), send(engine, target)
+    engine.acknowledge(b"{'code': 200}", ("192.168.1.21", udp_client.DEFAULT_PORT))
+    assert list(target.pending) == [second]
+    engine.acknowledge(b"{'code': 500, 'error': 'Busy'}", ("192.168.1.21", udp_client.DEFAULT_PORT))
+    assert target.pending == {}
+    assert (target.acked, target.errors) == (1, 1)
+
+def test_409_is_a_request_not_an_error(engine):
+    engine.delta = delta.KeyframeDelta()
+    target = engine.targets[2]
+    target.wire, target.schema_id, target.delta = wire.VERSION, 7, True
+    # Lost keyframe: a keyframe is queued, the schema is kept
+    seq = send(engine, target)
+    engine.acknowledge(b'{"code": 409, "wire": 1, "delta": 1, "keyframe": true, "seq": %d}' % seq, ("192.168.1.21", 0))
+    assert engine.delta.requested
+    engine.delta.requested = False
+    assert (target.schema_id, target.wire, target.delta) == (7, wire.VERSION, True)
+    # Unknown schema: announced again, deltas kept
+    seq = send(engine, target)
+    engine.acknowledge(b'{"code": 409, "wire": 1, "seq": %d}' % seq, ("192.168.1.21", 0))
+    assert (target.schema_id, target.wire, target.delta) == (None, wire.VERSION, True)
+    assert not engine.delta.requested
+    assert (target.requests, target.errors, target.acked) == (2, 0, 0)
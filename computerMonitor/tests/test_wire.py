@@ -0,0 +1,133 @@
+import json
+import math
+import wire
+import pytest
+import asyncio
+import udp_client
+
+TARGET = "192.168.1.30"
+
+PAYLOAD = {
+    "Network": {"up_rate": (12.5, "KB/s"), "dl_rate": (840.1, "KB/s"), "uploaded": (1520.3, "MB"), "downloaded": (90210.7, "MB")},
+    "CPU": {"usage": (37, "%"), "temperature": (61, "°C")},
+    "GPU": {"usage": (12, "%"), "temperature": (48, "°C")},
+    "Memory": {"swap": (3, "%"), "usage": (41, "%"), "free": (9876, "MB"), "used": (6543, "MB")},
+    "Disk": {"usage": (63, "%"), "total": (953, "GB"), "used": (600, "GB"), "free": (353, "GB")},
+    "IP": "192.168.1.20"
+}
+
+def trailer(seq=1):
+    return wire.TRAILER.pack(seq)
+
+@pytest.fixture
+def schemas():
+    # Dock side schemas, after the announcement of PAYLOAD's schema
+    schemas = {}
+    assert wire.decode(wire.schema_for(PAYLOAD).announcement + trailer(), schemas) is None
+    return schemas
+
+
+def test_data_round_trip(schemas):
+    packet = wire.schema_for(PAYLOAD).encode(PAYLOAD) + wire.target_ip(TARGET) + trailer(7)
+    assert wire.sequence(packet) == 7
+    assert wire.decode(packet, schemas) == dict(PAYLOAD, Target=TARGET)
+
+def test_keyframe_round_trip(schemas):
+    packet = wire.schema_for(PAYLOAD).encode_keyframe(PAYLOAD, 513) + wire.target_ip(TARGET) + trailer()
+    assert wire.decode(packet, schemas) == dict(PAYLOAD, Keyframe=513, Target=TARGET)
+
+def test_delta_round_trip(schemas):
+    changed = {"CPU": {"usage": (38, "%")}, "Network": {"dl_rate": (12.3, "KB/s")}, "Disk": {"free": (350, "GB")}}
+    packet = wire.schema_for(PAYLOAD).encode_delta(changed, 4) + wire.target_ip(TARGET) + trailer()
+    assert wire.decode(packet, schemas) == dict(changed, Delta=4, Target=TARGET)
+
+def test_empty_delta(schemas):
+    packet = wire.schema_for(PAYLOAD).encode_delta({}, 4) + trailer()
+    assert wire.decode(packet, schemas) == {"Delta": 4}
+
+def test_missing_values_are_nan(schemas):
+    device_info = dict(PAYLOAD, GPU={"usage": ("-", "%"), "temperature": ("-", "°C")})
+    del device_info["Disk"]
+    packet = wire.schema_for(device_info).encode(device_info) + trailer()
+    assert math.isnan(wire.schema_for(device_info).values.unpack_from(packet, wire.HEADER.size)[6])
+    decoded = wire.decode(packet, schemas)
+    assert decoded["GPU"] == {"usage": ("-", "%"), "temperature": ("-", "°C")}
+    assert decoded["Disk"] == {"usage": ("-", "%"), "total": ("-", "GB"), "used": ("-", "GB"), "free": ("-", "GB")}
+    assert "Target" not in decoded
+
+def test_invalid_ip():
+    packet = wire.schema_for(PAYLOAD).encode(dict(PAYLOAD, IP="-")) + trailer()
+    schemas = {}
+    wire.decode(wire.schema_for(PAYLOAD).announcement + trailer(), schemas)
+    assert wire.decode(packet, schemas)["IP"] == "0.0.0.0"
+
+def test_unknown_schema():
+    packet = wire.schema_for(PAYLOAD).encode(PAYLOAD) + trailer()
+    with pytest.raises(KeyError):
+        wire.decode(packet, {})
+
+def test_not_a_wire_packet():
+    with pytest.raises(ValueError):
+        wire.decode(b"XX" + bytes(20), {})
+
+def test_windows_units():
+    # The Windows backend reports "°" temperatures: another schema, same layout
+    device_info = dict(PAYLOAD, CPU={"usage": (37, "%"), "temperature": (61, "°")},
+                       GPU={"usage": (12, "%"), "temperature": (48, "°")})
+    schema = wire.schema_for(device_info)
+    assert schema is not wire.schema_for(PAYLOAD)
+    assert schema is wire.schema_for(dict(device_info))
+    assert schema.id != wire.schema_for(PAYLOAD).id
+    assert schema.values.size == wire.schema_for(PAYLOAD).values.size
+
+    schemas = {}
+    assert wire.decode(schema.announcement + trailer(), schemas) is None
+    decoded = wire.decode(schema.encode(device_info) + trailer(), schemas)
+    assert decoded["CPU"]["temperature"] == (61, "°")
+    assert decoded == device_info
+
+def test_encodable():
+    assert wire.encodable(PAYLOAD)
+    assert wire.encodable(dict(PAYLOAD, Target=TARGET))
+    assert wire.encodable({"CPU": {"usage": (38, "%")}})
+    assert not wire.encodable(dict(PAYLOAD, Stale=["GPU"]))
+    assert not wire.encodable(dict(PAYLOAD, History={"CPU": {"usage": {"60": [1, 2, 1.5, 2]}}}))
+    assert not wire.encodable(dict(PAYLOAD, CPU={"usage": (37, "%"), "frequency": (4200, "MHz")}))
+
+
+class Transport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append(data)
+
+    def close(self): pass
+
+def push(payloads):
+    # Packets sent to a dock that negotiated the binary format
+    async def run():
+        engine = udp_client.Engine(None, [(TARGET, udp_client.DEFAULT_PORT)], log=lambda line: None)
+        engine.loop = asyncio.get_running_loop()
+        engine.transport = Transport()
+        engine.targets[0].wire = wire.VERSION
+        for device_info in payloads: engine.push(device_info)
+        engine.close()
+        return engine.transport.sent
+    return asyncio.run(run())
+
+def test_engine_sends_binary():
+    schema, data = push([PAYLOAD])
+    assert schema[:2] == wire.MAGIC and data[:2] == wire.MAGIC
+    schemas = {}
+    wire.decode(schema, schemas)
+    assert wire.decode(data, schemas) == dict(PAYLOAD, Target=TARGET)
+
+def test_engine_sends_json_for_extra_keys():
+    # "Stale" cannot be carried by binary packets, that payload goes out as JSON
+    sent = push([PAYLOAD, dict(PAYLOAD, Stale=["GPU"]), PAYLOAD])
+    assert [packet[:2] == wire.MAGIC for packet in sent] == [True, True, False, True]
+    stale = json.loads(sent[2])
+    assert stale["Stale"] == ["GPU"]
+    assert stale["Target"] == TARGET
+    assert stale["Seq"] == 3
@@ -1,10 +1,58 @@
+import re
+import ast
+import json
+import wire
+import bisect
 import socket
+import asyncio
+
+DEFAULT_PORT = 32123
 
 server = None
 unicast_port = None
 unicast_ip = "255.255.255.255"
 
 
+def is_valid_ip(ip):
+    # Regular expression pattern for IP address
+    pattern = r'^((?:(?:25[0-5]|2[0-4]\d|((1\d{2})|([1-9]?\d)))\.){3}(?:25[0-5]|2[0-4]\d|((1\d{2})|([1-9]?\d))))$'
+
+    # Match the pattern using the match() method from re module
+    if re.match(pattern, ip):
+        # IP address format is valid
+        return True
+    else:
+        # IP address format is invalid
+        return False
+
+def parse_targets(text, port=DEFAULT_PORT):
+    # "192.168.1.10, 192.168.1.11:32124" -> [(ip, port)], ValueError on an invalid entry
+    targets = []
+    for entry in re.split(r"[,\s]+", text.strip()):
+        if not entry: continue
+        ip, sep, target_port = entry.partition(":")
+        if not is_valid_ip(ip) or (sep and not (target_port.isdigit() and 0 < int(target_port) < 65536)):
+            raise ValueError(f"Invalid target '{entry}'")
+        target = (ip, int(target_port) if sep else port)
+        if target not in targets: targets.append(target)
+    if not targets: raise ValueError("No target")
+    return targets
+
+
+def parse_ack(data):
+    # Device replies are dicts such as {"code": 200, "seq": 12} (JSON) or {'code': 500, 'error': '...'}
+    # (Python literal). Anything else is a ValueError, nothing is evaluated.
+    text = data.decode()
+    try:
+        reply = json.loads(text)
+    except ValueError:
+        try:
+            reply = ast.literal_eval(text)
+        except (SyntaxError, ValueError, TypeError, MemoryError, RecursionError):
+            raise ValueError("Invalid ack")
+    if not isinstance(reply, dict): raise ValueError("Invalid ack")
+    return reply
+
 def send(message):
     if server:
         server.sendto(message, (unicast_ip, unicast_port))
@@ -13,33 +61,383 @@ def send(message):
             retry_times -= 1
             try:
                 data, client_address = server.recvfrom(1024)
-                data = eval(data.decode())
                 if client_address[0] != unicast_ip: continue
+                try:
+                    data = parse_ack(data)
+                except ValueError:
+                    return "Invalid payload data"
 
-                if not isinstance(data, dict): return "Invalid payload data"
-                elif data.get("code", 500) == 200: return "Sent successfully."
+                if data.get("code", 500) == 200: return "Sent successfully."
                 else: return f"Device receive error ({data.get('error', 'Unknown error')})"
             except socket.timeout: continue
         return "Send timeout."
     else:
         return "Service not started."
 
-def init(port=32123):
-    global server, unicast_port
-    unicast_port = port
-
-    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+def create_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
 
     # Enable port reusage so we will be able to run multiple clients and servers on single (host, port).
     # Do not use socket.SO_REUSEADDR except you using linux(kernel<3.9): goto https://stackoverflow.com/questions/14388706/how-do-so-reuseaddr-and-so-reuseport-differ for more information.
     # For linux hosts all sockets that want to share the same address and port combination must belong to processes that share the same effective user ID!
     # So, on linux(kernel>=3.9) you have to run multiple servers and clients under one user to share the same (host, port).
     # Thanks to @stevenreddie
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
     # Enable broadcasting mode
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    return sock
+
+def init(port=DEFAULT_PORT):
+    global server, unicast_port
+    unicast_port = port
+
+    server = create_socket()
 
     # Set a timeout so the socket does not block
     # indefinitely when trying to receive data.
     server.settimeout(2)
+
+
+class AckProtocol(asyncio.DatagramProtocol):
+    def __init__(self, engine):
+        self.engine = engine
+
+    def datagram_received(self, data, addr):
+        self.engine.acknowledge(data, addr)
+
+    def error_received(self, exc):
+        self.engine.log(f"Socket error [{exc}].")
+
+
+class RttHistogram:
+    # Round trip times in log spaced millisecond buckets, the last one is open ended
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max: self.max = ms
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, ms
+        rank = p / 100 * self.count
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            if running >= rank: return min(bound, self.max)
+        return self.max
+
+    def __str__(self):
+        if not self.count: return "rtt -"
+        return "rtt avg %.1f ms, p50 %.0f ms, p95 %.0f ms, max %.1f ms" % (
+            self.total / self.count, self.percentile(50), self.percentile(95), self.max)
+
+
+class Target:
+    # Send / ack state of one dock
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.port = port
+        self.address = (ip, port)
+        # Appended to the shared payload, see Engine.encode()
+        self.suffix = bytes(', "Target": ' + json.dumps(ip) + '}', 'utf-8')
+        self.seq = 0 # sequence number of the last packet sent, echoed by the dock in its ack
+        self.pending = {} # {seq: (send time, timeout handle)} of the packets in flight, oldest first
+        # Binary wire version accepted by the dock, None while it gets JSON
+        self.wire = None
+        self.wire_ip = wire.target_ip(ip)
+        self.schema_id = None # schema last announced to the dock
+        self.since_schema = 0 # data packets sent since then
+        self.delta = False # the dock takes keyframes + deltas, see delta.py
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.requests = 0 # 409 replies: the dock asked for the schema or a keyframe
+        self.timeouts = 0 # lost: no ack within Engine.ack_timeout
+        self.late = 0 # acks for a packet that already timed out, or duplicated
+        self.rtt = RttHistogram()
+
+    def next_seq(self):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return self.seq
+
+    def summary(self):
+        loss = 100.0 * self.timeouts / self.sent if self.sent else 0.0
+        return "sent %d, acked %d, resend requests %d, errors %d, lost %d (%.1f%%), late %d, %s" % (
+            self.sent, self.acked, self.requests, self.errors, self.timeouts, loss, self.late, self.rtt)
+
+    def __str__(self):
+        return self.ip if self.port == DEFAULT_PORT else f"{self.ip}:{self.port}"
+
+
+class Engine:
+    # asyncio send pipeline: sending never waits for the acknowledgement, acks are handled
+    # as they arrive and collection runs on a fixed schedule, independent of the network.
+    # Each tick collects and serialises once, then sends to every target. Ack state is kept
+    # per target, so a dead dock does not slow down the others.
+    # Packets carry a per-target sequence number ("Seq" in JSON, wire.TRAILER in binary) that the
+    # dock echoes in its ack, so several packets can be in flight and a late ack is never taken
+    # for the ack of a newer packet. Acks without "seq" (older docks) match the oldest packet.
+    # With a cadence.Cadence the payload is sampled every cadence.sample_interval and only
+    # pushed when the cadence says so, instead of every `interval`.
+    # Driven by the GUI from its broadcast thread, or directly with run_forever().
+    ack_timeout = 4 # seconds, as long as the two 2 s receive timeouts of send()
+    report_interval = 60 # seconds between two statistics lines per target
+    log_success = True # one line per acked packet, the statistics lines cover it when off
+    schema_repeat = 60 # data packets between two announcements of the binary schema
+
+    def __init__(self, collect, targets, interval=5, log=print, binary=True, delta=None, cadence=None,
+                 history=None, metrics=None, recorder=None, reports=()):
+        self.collect = collect # blocking, returns the payload dict, runs in a worker thread
+        # [(ip, port)], see parse_targets()
+        self.targets = [Target(ip, port) for ip, port in targets]
+        # Acks are matched by IP (the dock may answer from another port), then by seq
+        self.by_ip = {}
+        for target in self.targets: self.by_ip.setdefault(target.ip, []).append(target)
+        self.interval = interval
+        self.log = log
+        # Offer the binary wire format, docks that accept it say so in their ack
+        self.binary = binary
+        # delta.KeyframeDelta shared by the docks that accept deltas, None to never offer them
+        self.delta = delta
+        self.cadence = cadence
+        # history.History fed with every collected sample, it may attach "History" to the payload
+        self.history = history
+        # openmetrics.MetricsEndpoint serving the last payload, updated every tick
+        self.metrics = metrics
+        self.collect_seconds = None # duration of the last collection
+        # recording.Recorder appending every pushed payload
+        self.recorder = recorder
+        # Objects whose summary() goes in each statistics report, e.g. a scheduler.Scheduler,
+        # closed with the engine when they have a close()
+        self.reports = list(reports)
+        self.running = True
+        self.reported = None
+        self.loop = None
+        self.stopped = None
+        self.transport = None
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.reported = self.loop.time()
+        self.transport, _ = await self.loop.create_datagram_endpoint(lambda: AckProtocol(self), sock=create_socket())
+        if self.metrics is not None:
+            try:
+                await self.metrics.open()
+            except OSError as e:
+                self.log(f"Metrics endpoint not started [{e}].")
+
+    def close(self):
+        for target in self.targets:
+            for _, handle in target.pending.values(): handle.cancel()
+            target.pending.clear()
+        if self.transport is not None: self.transport.close()
+        if self.metrics is not None: self.metrics.close()
+        if self.recorder is not None: self.recorder.close()
+        for source in self.reports:
+            if hasattr(source, "close"): source.close()
+
+    async def run(self):
+        await self.open()
+        try:
+            deadline = self.loop.time()
+            while self.running:
+                await self.tick()
+                # The next tick is due one interval after the previous one started
+                deadline += self.interval if self.cadence is None else self.cadence.sample_interval
+                now = self.loop.time()
+                if deadline < now:
+                    # Collection overran the interval, skip the missed ticks
+                    deadline = now
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), deadline - now)
+                except asyncio.TimeoutError: pass
+        finally:
+            self.close()
+            self.report()
+
+    async def tick(self):
+        try:
+            start = self.loop.time()
+            device_info = await self.loop.run_in_executor(None, self.collect)
+            self.collect_seconds = self.loop.time() - start
+            if self.history is not None: device_info = self.history.record(device_info)
+            if self.metrics is not None: self.metrics.update(device_info, self)
+            if self.cadence is None or self.cadence.due(device_info, self.loop.time()): self.push(device_info)
+        except Exception as e:
+            self.log("Fail to send [" + str(e) + "].")
+        if self.loop.time() - self.reported >= self.report_interval: self.report()
+
+    def push(self, device_info):
+        # Sends one payload to every target.
+        if self.recorder is not None:
+            try:
+                self.recorder.append(device_info)
+            except OSError as e:
+                self.log(f"Recording stopped [{e}].")
+                self.recorder = None
+        # One keyframe / delta step per push, shared by the docks in delta mode
+        frame = None
+        if self.delta is not None and any(target.delta for target in self.targets):
+            frame = self.delta.next(device_info)
+        # Each encoding is done at most once per push, whatever the number of targets.
+        # Payloads with keys outside the binary layout go out as JSON to every dock.
+        binary = self.binary and wire.encodable(device_info)
+        bodies = {}
+        schema = None
+        for target in self.targets:
+            form = (binary and bool(target.wire), target.delta and frame is not None)
+            if form not in bodies:
+                if form[0] and schema is None: schema = wire.schema_for(device_info)
+                bodies[form] = self.encode(device_info, schema if form[0] else None, frame if form[1] else None)
+            if form[0]:
+                self.send_binary(target, schema, bodies[form])
+            else:
+                seq = target.next_seq()
+                self.send(target, bodies[form] + b', "Seq": %d' % seq + target.suffix, seq)
+
+    def report(self):
+        # Statistics line of each target, in the GUI log / on stdout
+        self.reported = self.loop.time()
+        if self.cadence is not None: self.log(self.cadence.summary())
+        for source in self.reports: self.log(source.summary())
+        for target in self.targets:
+            if target.sent: self.log(f"[{target}] {target.summary()}")
+
+    def encode(self, device_info, schema=None, frame=None):
+        # Binary packet without the target IP, or JSON without the closing brace: each
+        # target appends its "Target"
+        if frame is not None:
+            keyframe, seq, payload = frame
+            if schema is not None:
+                return schema.encode_keyframe(payload, seq) if keyframe else schema.encode_delta(payload, seq)
+            if not keyframe: return bytes(json.dumps(dict({"Delta": seq}, **payload)), 'utf-8')[:-1]
+            device_info = dict(payload, Keyframe=seq)
+        elif schema is not None:
+            return schema.encode(device_info)
+        elif self.delta is not None:
+            device_info = dict(device_info, Deltas=1)
+        if self.binary: device_info = dict(device_info, Wire=wire.VERSION)
+        return bytes(json.dumps(device_info), 'utf-8')[:-1]
+
+    def send_binary(self, target, schema, packet):
+        if target.schema_id != schema.id or target.since_schema >= self.schema_repeat:
+            seq = target.next_seq()
+            self.send(target, schema.announcement + wire.TRAILER.pack(seq), seq)
+            target.schema_id = schema.id
+            target.since_schema = 0
+        seq = target.next_seq()
+        self.send(target, packet + target.wire_ip + wire.TRAILER.pack(seq), seq)
+        target.since_schema += 1
+
+    def send(self, target, message, seq):
+        try:
+            self.transport.sendto(message, target.address)
+        except Exception as e:
+            self.log_target(target, "Fail to send [" + str(e) + "].")
+            return
+        target.sent += 1
+        target.pending[seq] = (self.loop.time(), self.loop.call_later(self.ack_timeout, self.expire, target, seq))
+
+    def expire(self, target, seq):
+        # This packet got no ack in time
+        del target.pending[seq]
+        target.timeouts += 1
+        self.log_target(target, "Send timeout.")
+
+    def acknowledge(self, data, addr):
+        targets = self.by_ip.get(addr[0])
+        if not targets: return
+        now = self.loop.time()
+        try:
+            reply = parse_ack(data)
+        except Exception:
+            reply = None
+
+        seq = reply.get("seq") if reply is not None else None
+        # Several docks behind one IP (different ports): the one with this packet in flight,
+        # the one at the sender's port first
+        candidates = [target for target in targets if seq in target.pending] or targets
+        target = next((target for target in candidates if target.address == addr[:2]), candidates[0])
+        if seq is None and target.pending:
+            # No sequence number to match, take the oldest packet in flight
+            seq = next(iter(target.pending))
+        entry = target.pending.pop(seq, None)
+        if entry is None:
+            target.late += 1
+            self.log_target(target, "Late ack.")
+            return
+        sent_at, handle = entry
+        handle.cancel()
+        target.rtt.add(now - sent_at)
+
+        if reply is None:
+            target.errors += 1
+            self.log_target(target, "Invalid payload data")
+            return
+
+        if self.binary: self.negotiate(target, reply)
+        if self.delta is not None: self.negotiate_delta(target, reply)
+        code = reply.get("code", 500)
+        if code == 200:
+            target.acked += 1
+            if self.log_success: self.log_target(target, "Sent successfully.")
+        elif code == 409 and (reply.get("wire") == wire.VERSION or reply.get("keyframe")):
+            # Not an error: the dock asks for the schema or a keyframe, negotiate() /
+            # negotiate_delta() queued it for the next push
+            target.requests += 1
+        else:
+            target.errors += 1
+            self.log_target(target, f"Device receive error ({reply.get('error', 'Unknown error')})")
+
+    def negotiate(self, target, reply):
+        # {"code": 200, "wire": 1}: the dock decodes binary packets of that version.
+        # {"code": 409, "wire": 1}: it does not know the current schema, announce it again.
+        # A 409 asking for a keyframe is about the delta state, the schema is kept.
+        # An error (not a 409 request) without "wire" from a binary dock: fall back to JSON.
+        version = reply.get("wire")
+        if version == wire.VERSION:
+            if target.wire is None:
+                target.wire = version
+                self.log_target(target, f"Using binary wire format v{version}.")
+            if reply.get("code") == 409 and not reply.get("keyframe"): target.schema_id = None
+        elif target.wire is not None and reply.get("code", 500) not in (200, 409):
+            target.wire = None
+            target.schema_id = None
+            self.log_target(target, "Falling back to JSON.")
+
+    def negotiate_delta(self, target, reply):
+        # {"code": 200, "delta": 1}: the dock takes keyframes + deltas.
+        # {"code": 409, "keyframe": true}: it lost the current keyframe, send one with the next push.
+        # An error (not a 409 request) without "delta" from a delta dock: fall back to full payloads.
+        if reply.get("delta") == 1:
+            if not target.delta:
+                target.delta = True
+                self.delta.request()
+                self.log_target(target, "Using keyframes + deltas.")
+        elif target.delta and reply.get("code", 500) not in (200, 409):
+            target.delta = False
+            self.log_target(target, "Falling back to full payloads.")
+        if target.delta and reply.get("keyframe"): self.delta.request()
+
+    def log_target(self, target, text):
+        self.log(text if len(self.targets) == 1 else f"[{target}] {text}")
+
+    def stop(self):
+        # Can be called from any thread
+        self.running = False
+        if self.loop is not None and self.stopped is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def run_forever(self):
+        if self.running: asyncio.run(self.run())
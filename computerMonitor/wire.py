@@ -0,0 +1,181 @@
+import json
+import math
+import socket
+import struct
+import zlib
+
+# Compact binary encoding of the device_info payload, negotiated per dock (see udp_client.Engine).
+#
+# Every packet starts with HEADER: magic "VB", wire version, packet kind and schema id.
+# - KIND_SCHEMA: the header followed by the JSON list of [group, key, unit, format, decimals]
+#   fields. Sent once per session (and when the dock asks for it), so names and units do
+#   not travel with every packet.
+# - KIND_DATA: the header followed by the field values packed with the schema's struct
+#   layout, the sender IP and the target IP (4 bytes each). Missing values ("-") are NaN.
+# - KIND_KEYFRAME: a data packet with the 16 bit keyframe sequence number after the header.
+# - KIND_DELTA: the header, the keyframe sequence number, a 32 bit mask of the fields
+#   present, their values and the target IP. See delta.py.
+# Every packet ends with TRAILER, the sender's sequence number for that dock, echoed in the ack.
+# Only the FIELDS and the IPs are carried: a payload with other keys is sent as JSON, see
+# encodable().
+
+MAGIC = b"VB"
+VERSION = 1
+KIND_DATA = 0
+KIND_SCHEMA = 1
+KIND_KEYFRAME = 2
+KIND_DELTA = 3
+HEADER = struct.Struct("<2sBBI")
+SEQ = struct.Struct("<H")
+MASK = struct.Struct("<HI")
+TRAILER = struct.Struct("<I")
+
+# (group, key, default unit, struct format, decimals)
+FIELDS = (
+    ("Network", "up_rate", "KB/s", "f", 1),
+    ("Network", "dl_rate", "KB/s", "f", 1),
+    # Totals can exceed the 24 bit mantissa of a float
+    ("Network", "uploaded", "MB", "d", 1),
+    ("Network", "downloaded", "MB", "d", 1),
+    ("CPU", "usage", "%", "f", 0),
+    ("CPU", "temperature", "°C", "f", 0),
+    ("GPU", "usage", "%", "f", 0),
+    ("GPU", "temperature", "°C", "f", 0),
+    ("Memory", "swap", "%", "f", 0),
+    ("Memory", "usage", "%", "f", 0),
+    ("Memory", "free", "MB", "f", 0),
+    ("Memory", "used", "MB", "f", 0),
+    ("Disk", "usage", "%", "f", 0),
+    ("Disk", "total", "GB", "f", 0),
+    ("Disk", "used", "GB", "f", 0),
+    ("Disk", "free", "GB", "f", 0),
+)
+
+# "cpu.usage" -> ("CPU", "usage"), for the configuration file
+FIELD_NAMES = {f"{group}.{key}".lower(): (group, key) for group, key, _, _, _ in FIELDS}
+
+# {group: {key}} carried by the binary packets, with the sender "IP" and the per-dock "Target"
+GROUP_KEYS = {}
+for group, key, _, _, _ in FIELDS: GROUP_KEYS.setdefault(group, set()).add(key)
+
+
+class Schema:
+    def __init__(self, fields):
+        self.fields = tuple(tuple(field) for field in fields)
+        # Values, then the sender IP. The target IP is appended per dock.
+        self.values = struct.Struct("<" + "".join(field[3] for field in self.fields) + "4s")
+        self.description = json.dumps([list(field) for field in self.fields], ensure_ascii=False).encode()
+        self.id = zlib.crc32(self.description)
+        self.announcement = HEADER.pack(MAGIC, VERSION, KIND_SCHEMA, self.id) + self.description
+        self.header = HEADER.pack(MAGIC, VERSION, KIND_DATA, self.id)
+        self.keyframe_header = HEADER.pack(MAGIC, VERSION, KIND_KEYFRAME, self.id)
+        self.delta_header = HEADER.pack(MAGIC, VERSION, KIND_DELTA, self.id)
+        self.field_structs = [struct.Struct("<" + field[3]) for field in self.fields]
+
+    @staticmethod
+    def _number(value):
+        value = value[0] if isinstance(value, (tuple, list)) else value
+        return float(value) if isinstance(value, (int, float)) else math.nan
+
+    def _pack(self, device_info):
+        values = [Schema._number(device_info.get(group, {}).get(key, "-")) for group, key, _, _, _ in self.fields]
+        try:
+            ip = socket.inet_aton(device_info.get("IP", "0.0.0.0"))
+        except OSError:
+            ip = bytes(4)
+        return self.values.pack(*values, ip)
+
+    def encode(self, device_info):
+        # Data packet without the target IP
+        return self.header + self._pack(device_info)
+
+    def encode_keyframe(self, device_info, seq):
+        return self.keyframe_header + SEQ.pack(seq) + self._pack(device_info)
+
+    def encode_delta(self, changed, seq):
+        # Only the fields present in `changed`, see delta.KeyframeDelta
+        mask = 0
+        parts = []
+        for i, (group, key, _, _, _) in enumerate(self.fields):
+            value = changed.get(group, {}).get(key)
+            if value is None: continue
+            mask |= 1 << i
+            parts.append(self.field_structs[i].pack(Schema._number(value)))
+        return self.delta_header + MASK.pack(seq, mask) + b"".join(parts)
+
+    def _value(self, field, value):
+        group, key, unit, _, decimals = field
+        if math.isnan(value): return ("-", unit)
+        return (int(value) if decimals == 0 else round(value, decimals), unit)
+
+    def decode(self, packet):
+        # Packet without its TRAILER
+        kind = packet[3]
+        offset = HEADER.size
+        device_info = {}
+        if kind == KIND_DELTA:
+            seq, mask = MASK.unpack_from(packet, offset)
+            offset += MASK.size
+            device_info["Delta"] = seq
+            for i, field in enumerate(self.fields):
+                if not mask & (1 << i): continue
+                value = self.field_structs[i].unpack_from(packet, offset)[0]
+                offset += self.field_structs[i].size
+                device_info.setdefault(field[0], {})[field[1]] = self._value(field, value)
+        else:
+            if kind == KIND_KEYFRAME:
+                device_info["Keyframe"] = SEQ.unpack_from(packet, offset)[0]
+                offset += SEQ.size
+            values = self.values.unpack_from(packet, offset)
+            offset += self.values.size
+            for field, value in zip(self.fields, values):
+                device_info.setdefault(field[0], {})[field[1]] = self._value(field, value)
+            device_info["IP"] = socket.inet_ntoa(values[-1])
+        target = packet[offset:]
+        if len(target) == 4: device_info["Target"] = socket.inet_ntoa(target)
+        return device_info
+
+
+# One schema per set of units, units differ between backends (e.g. "°" on Windows)
+_schemas = {}
+
+def schema_for(device_info):
+    units = []
+    for group, key, unit, _, _ in FIELDS:
+        value = device_info.get(group, {}).get(key)
+        units.append(value[1] if value and len(value) > 1 else unit)
+    units = tuple(units)
+    schema = _schemas.get(units)
+    if schema is None:
+        schema = _schemas[units] = Schema([(group, key, unit, fmt, decimals)
+                                           for (group, key, _, fmt, decimals), unit in zip(FIELDS, units)])
+    return schema
+
+def encodable(device_info):
+    # False when the payload has keys the binary layout would drop (e.g. "Stale" or
+    # "History"), such payloads go out as JSON
+    for name, value in device_info.items():
+        if name == "IP" or name == "Target": continue
+        keys = GROUP_KEYS.get(name)
+        if keys is None or not isinstance(value, dict) or not keys.issuperset(value): return False
+    return True
+
+def target_ip(ip):
+    # Suffix of a data packet for this dock
+    return socket.inet_aton(ip)
+
+def sequence(packet):
+    # Sequence number to echo in the ack
+    return TRAILER.unpack_from(packet, len(packet) - TRAILER.size)[0]
+
+def decode(packet, schemas):
+    # Dock side reference decoder: schemas is the {id: Schema} seen in this session.
+    # Returns the device_info of a data / keyframe / delta packet, None for a schema announcement.
+    magic, version, kind, schema_id = HEADER.unpack_from(packet)
+    if magic != MAGIC or version != VERSION: raise ValueError("Not a wire v%d packet" % VERSION)
+    packet = packet[:-TRAILER.size]
+    if kind == KIND_SCHEMA:
+        schemas[schema_id] = Schema(json.loads(packet[HEADER.size:].decode()))
+        return None
+    if schema_id not in schemas: raise KeyError("Unknown schema %08x" % schema_id)
+    return schemas[schema_id].decode(packet)